@@ -45,6 +45,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'game.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -73,13 +74,46 @@ WSGI_APPLICATION = 'Game_API.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# SQLite concurrency profile (see game.sqlite). WAL lets readers run alongside the single writer;
+# synchronous=NORMAL is durable across crashes in WAL mode and only risks the last commits on power loss.
+# Writers queue for up to busy_timeout ms, and atomic() takes the write lock at BEGIN (IMMEDIATE).
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL;'
+    'PRAGMA synchronous=NORMAL;'
+    'PRAGMA busy_timeout=5000;'
+    'PRAGMA cache_size=-20000;'
+    'PRAGMA mmap_size=134217728;'
+    'PRAGMA temp_store=MEMORY;'
+)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'game.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Persistent connections skip the reconnect and the PRAGMA setup on every request
+        'CONN_MAX_AGE': int(os.getenv("DATABASE_CONN_MAX_AGE", "600")),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': SQLITE_PRAGMAS,
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Read replicas (see game.routers): DATABASE_REPLICA_PATHS lists SQLite copies of the primary, separated by
+# commas, kept in sync outside Django. Safe requests read from them; a client that wrote reads from the primary
+# for REPLICA_STICKY_SECONDS, which should cover the replication lag. That is tracked in REPLICA_STICKY_CACHE,
+# which has to be shared by every worker (the middleware refuses LocMemCache). Run the test suite without replicas;
+# ReplicaRoutingTests syncs its own replica file.
+DATABASE_REPLICAS = []
+for index, path in enumerate(filter(None, os.getenv("DATABASE_REPLICA_PATHS", "").split(',')), 1):
+    # A mirror under test, so the runner does not create an empty database for it
+    DATABASES[f'replica_{index}'] = {**DATABASES['default'], 'NAME': path.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{index}')
+DATABASE_ROUTERS = ['game.routers.PrimaryReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_STICKY_CACHE = 'default'
+
 # DATABASES = {  # პოსგრესისთვის
 #     'default': {
 #         'ENGINE': 'django.db.backends.postgresql',
@@ -91,6 +125,23 @@ DATABASES = {
 #     }
 # }
 
+# Cache
+# Badge counters live here. Local memory is per process; deployments running several workers
+# should point this at a shared backend (Redis, Memcached) so every worker sees the same counts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Serialized public reads, keyed by collection versions (see game.caching); never stale, so a
+    # per-process cache is safe here
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+}
+RESPONSE_CACHE_ALIAS = 'responses'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -127,7 +178,15 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+STORAGES = {
+    # Uploads are stored once per distinct content under their digest, see game.storage
+    'default': {
+        'BACKEND': 'game.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -143,16 +202,47 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly'
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'game.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
+    # Cursor pagination on every list endpoint; each viewset sets a stable `ordering`
+    'DEFAULT_PAGINATION_CLASS': 'game.pagination.DefaultCursorPagination',
+    'PAGE_SIZE': 50,
     # 'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
 }
 
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Seconds between heartbeats on the notification event stream
+NOTIFICATION_STREAM_HEARTBEAT = 15
+
+# Write-behind voting: buffer match votes in memory and flush them in batches every
+# VOTE_FLUSH_INTERVAL seconds instead of writing the GameSchedule row on every request
+VOTE_WRITE_BEHIND = os.getenv("VOTE_WRITE_BEHIND", "false").lower() == "true"
+VOTE_FLUSH_INTERVAL = 1.0
+# Vote tallies in cached schedule pages catch up within this many seconds; the votes version is written
+# at most once per interval per worker instead of on every vote
+VOTE_VERSION_INTERVAL = 1.0
+
+# Logins record last_login in memory; it is written in one batch per LAST_LOGIN_FLUSH_INTERVAL seconds
+LAST_LOGIN_FLUSH_INTERVAL = 60.0
+
+# Processes rendering thumbnails and WebP versions of uploaded images; 0 renders inline
+DERIVATIVE_WORKERS = 2
+
+# Authenticated tokens cached per process; entries live at most TOKEN_CACHE_TTL seconds, which bounds
+# how long other changes to a user (is_active, is_staff) take to be seen. Logouts reach the other workers through
+# the default cache, so outside DEBUG it has to be shared (Redis, Memcached) - or TOKEN_CACHE_SIZE set to 0
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 60
+
+# Threads that hash passwords for login and registration (default: one per CPU), and how many more
+# hashes may wait for one before new sign-ins are answered with 503
+PASSWORD_HASHING_WORKERS = None
+PASSWORD_HASHING_BACKLOG = 32
+
 # AUTHENTICATION_BACKENDS = [
 #     'game.models.CustomUser',
 #     'django.contrib.auth.backends.ModelBackend',  # Default backend
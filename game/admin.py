@@ -1,11 +1,14 @@
 from django.contrib import admin
-from game.models import CustomUser, Team, Notification, Invitation, Tournament, TournamentRegistration, GameSchedule, Game
+from game.models import Blob, CustomUser, Team, Notification, NotificationCursor, Invitation, Tournament, TournamentRegistration, GameSchedule, Vote, Game
 
 admin.site.register(CustomUser)
 admin.site.register(Team)
 admin.site.register(Invitation)
 admin.site.register(Notification)
+admin.site.register(NotificationCursor)
 admin.site.register(Tournament)
 admin.site.register(TournamentRegistration)
 admin.site.register(GameSchedule)
+admin.site.register(Vote)
+admin.site.register(Blob)
 # admin.site.register(Game)
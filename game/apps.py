@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class GameConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'game'
+
+    def ready(self):
+        # Connects the signal receivers that live outside models.py
+        from . import authentication, caching, counters, events  # noqa: F401
+
+        authentication.require_shared_auth_cache()
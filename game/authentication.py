@@ -0,0 +1,111 @@
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from .models import CustomUser
+
+
+# Token authentication with an in-process cache - a bounded LRU of token key -> (token, user) that skips the
+# Token join CustomUser query. Each entry remembers the token's auth version from the shared cache; logout,
+# a password change or a deleted token replaces that version, which invalidates the entry in every worker.
+# A version the shared cache has lost is regenerated, so an eviction can only cause a miss, never a stale hit.
+# Invalidation only reaches other workers when the default cache is shared by them (Redis, Memcached); with the
+# per-process LocMemCache the other workers would serve their copy until TOKEN_CACHE_TTL, so outside DEBUG the
+# app refuses to start with it unless TOKEN_CACHE_SIZE is 0, which leaves every entry evicted as soon as it is set.
+VERSION_KEY = 'auth:version:{}'
+VERSION_TIMEOUT = 60 * 60 * 24
+
+
+def auth_version(key):
+    return cache.get_or_set(VERSION_KEY.format(key), lambda: uuid.uuid4().hex, VERSION_TIMEOUT)
+
+
+def invalidate_token(key):
+    cache.set(VERSION_KEY.format(key), uuid.uuid4().hex, VERSION_TIMEOUT)
+
+
+class TokenCache:
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[3] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, token, version):
+        with self.lock:
+            self.entries[key] = (token, token.user, version, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+token_cache = TokenCache(getattr(settings, 'TOKEN_CACHE_SIZE', 10000), getattr(settings, 'TOKEN_CACHE_TTL', 60))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        # Read before the lookup, so an invalidation racing with it leaves the new entry already stale
+        current = auth_version(key)
+        entry = token_cache.get(key)
+        if entry is not None:
+            token, user, version, _ = entry
+            if version == current:
+                # Views modify request.user, so each request gets its own copies
+                user = copy.copy(user)
+                token = copy.copy(token)
+                token.user = user
+                return user, token
+            token_cache.discard(key)
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, copy.copy(token), current)
+        return user, token
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_saved_user(sender, instance, created, **kwargs):
+    if created:
+        return
+    # Cached copies of the user would otherwise be served, and saved back, with the old field values
+    keys = list(Token.objects.filter(user=instance).values_list('key', flat=True))
+    transaction.on_commit(lambda: [invalidate_token(key) for key in keys])
+
+
+def require_shared_auth_cache():
+    if settings.DEBUG or not getattr(settings, 'TOKEN_CACHE_SIZE', 10000):
+        return
+    if settings.CACHES[DEFAULT_CACHE_ALIAS]['BACKEND'].endswith('.LocMemCache'):
+        raise ImproperlyConfigured(
+            "The token cache needs a default cache shared by every worker, such as Redis or Memcached; with "
+            "LocMemCache a logout or password change only reaches the current worker. Set TOKEN_CACHE_SIZE = 0 "
+            "to authenticate every request against the database instead."
+        )
@@ -0,0 +1,179 @@
+import abc
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
+from .models import CollectionVersion, CustomUser, GameSchedule, Vote
+
+logger = logging.getLogger(__name__)
+
+
+# Write-behind buffers - requests record into memory and return at once, a daemon thread
+# writes what accumulated in one batched transaction every `interval` seconds
+class WriteBehindBuffer(abc.ABC):
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # Started lazily, so forked workers each get their own flusher
+        with self.lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while not self._wakeup.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("%s flush failed", type(self).__name__)
+            finally:
+                close_old_connections()
+
+    @abc.abstractmethod
+    def flush(self):
+        pass
+
+
+class VoteBuffer(WriteBehindBuffer):
+    # Keys being written stay in `inflight` until their transaction commits, so a repeat vote arriving
+    # during a flush is still rejected and nothing is counted twice across the flush boundary
+    def __init__(self, interval=1.0):
+        super().__init__(interval)
+        self.pending = {}
+        self.inflight = set()
+
+    def add(self, game_id, user_id, team):
+        key = (game_id, user_id)
+        with self.lock:
+            if key in self.pending or key in self.inflight:
+                return False
+        # Votes flushed earlier are found with one indexed lookup; this is a read, never a write
+        if Vote.objects.filter(game_id=game_id, user_id=user_id).exists():
+            return False
+        with self.lock:
+            if key in self.pending or key in self.inflight:
+                return False
+            self.pending[key] = team
+        self.start()
+        return True
+
+    def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, {}
+            self.inflight.update(batch)
+        if not batch:
+            return 0
+        try:
+            counted = write_votes(batch)
+        except Exception:
+            # Nothing was committed, so the votes go back to wait for the next flush
+            with self.lock:
+                for key, team in batch.items():
+                    self.pending.setdefault(key, team)
+            raise
+        finally:
+            with self.lock:
+                self.inflight.difference_update(batch)
+        return counted
+
+
+def write_votes(batch, attempts=3):
+    # Writes {(game_id, user_id): team} in one transaction: ledger rows first, then one tally update per game.
+    # Votes already in the ledger (from another worker) are dropped; a concurrent insert retries the batch.
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                game_ids = {game_id for game_id, _ in batch}
+                user_ids = {user_id for _, user_id in batch}
+                existing = set(Vote.objects.filter(game_id__in=game_ids, user_id__in=user_ids).values_list('game_id', 'user_id'))
+                votes = [Vote(game_id=game_id, user_id=user_id, team=team)
+                         for (game_id, user_id), team in batch.items() if (game_id, user_id) not in existing]
+                Vote.objects.bulk_create(votes)
+
+                tallies = defaultdict(Counter)
+                for vote in votes:
+                    tallies[vote.game_id][Vote.TALLY_FIELDS[vote.team]] += 1
+                for game_id, tally in tallies.items():
+                    GameSchedule.objects.filter(pk=game_id).update(
+                        vote=F('vote') + sum(tally.values()),
+                        **{field: F(field) + count for field, count in tally.items()})
+                if tallies:
+                    # Once per flush, so a busy match does not turn the version row into a per-vote hot spot
+                    CollectionVersion.objects.bump(CollectionVersion.VOTES)
+            return len(votes)
+        except IntegrityError:
+            if attempt == attempts - 1:
+                raise
+
+
+class VersionBumpBuffer(WriteBehindBuffer):
+    # Collects collection names to bump and bumps each once per flush. Cached pages showing the
+    # collection lag by at most the interval, and the version row is written once per interval
+    # instead of once per change.
+    def __init__(self, interval=1.0):
+        super().__init__(interval)
+        self.pending = set()
+
+    def add(self, *names):
+        with self.lock:
+            self.pending.update(names)
+        self.start()
+
+    def flush(self):
+        with self.lock:
+            names, self.pending = self.pending, set()
+        if not names:
+            return 0
+        try:
+            CollectionVersion.objects.bump(*names)
+        except Exception:
+            with self.lock:
+                self.pending.update(names)
+            raise
+        return len(names)
+
+
+class LastLoginBuffer(WriteBehindBuffer):
+    # Keeps the latest login time per user, so a user who logs in many times between flushes is written once.
+    # The flush only ever moves last_login forward, whichever worker's batch lands first.
+    def __init__(self, interval=60.0):
+        super().__init__(interval)
+        self.pending = {}
+
+    def add(self, user_id, when):
+        with self.lock:
+            if user_id not in self.pending or self.pending[user_id] < when:
+                self.pending[user_id] = when
+        self.start()
+
+    def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, {}
+        if not batch:
+            return 0
+        users = [CustomUser(pk=user_id, last_login=Greatest(Coalesce('last_login', Value(when)), Value(when)))
+                 for user_id, when in batch.items()]
+        try:
+            CustomUser.objects.bulk_update(users, ['last_login'], batch_size=500)
+        except Exception:
+            with self.lock:
+                for user_id, when in batch.items():
+                    if user_id not in self.pending or self.pending[user_id] < when:
+                        self.pending[user_id] = when
+            raise
+        return len(batch)
+
+
+vote_buffer = VoteBuffer(getattr(settings, 'VOTE_FLUSH_INTERVAL', 1.0))
+version_buffer = VersionBumpBuffer(getattr(settings, 'VOTE_VERSION_INTERVAL', 1.0))
+last_login_buffer = LastLoginBuffer(getattr(settings, 'LAST_LOGIN_FLUSH_INTERVAL', 60.0))
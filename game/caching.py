@@ -0,0 +1,96 @@
+import hashlib
+import threading
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+from .models import CollectionVersion, CustomUser, Tournament, GameSchedule, Team
+
+
+# Conditional GET - list and retrieve answer If-None-Match / If-Modified-Since from the version stamps of
+# the collections they read: one primary-key query, and a 304 never runs the queryset or the serializer.
+# The ETag also covers the path with its query string and the negotiated media type, so pages differ.
+class ConditionalGetMixin:
+    version_collections = ()
+
+    def get_validators(self, request):
+        stamps = list(CollectionVersion.objects.filter(name__in=self.version_collections).order_by('name').values_list(
+            'name', 'version', 'updated_at'))
+        key = ':'.join(f'{name}={version}' for name, version, _ in stamps)
+        key = f'{key}:{request.get_full_path()}:{request.accepted_media_type}'
+        last_modified = max((updated_at for _, _, updated_at in stamps), default=None)
+        return f'"{hashlib.md5(key.encode()).hexdigest()}"', last_modified and last_modified.timestamp()
+
+    def conditional(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.fresh_response(etag, handler, request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def fresh_response(self, etag, handler, request, *args, **kwargs):
+        return handler(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+
+# Response cache - serialized response data of public reads, stored under the ETag above. The ETag changes
+# with every collection version, so entries are never stale and need no TTL; old ones age out of the cache.
+# Only for endpoints whose output does not depend on the user. Hits and misses are counted per process.
+response_cache_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(view, outcome):
+    with _stats_lock:
+        response_cache_stats[f'{view}:{outcome}'] += 1
+
+
+class CachedResponseMixin(ConditionalGetMixin):
+    def fresh_response(self, etag, handler, request, *args, **kwargs):
+        cache = caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+        # Host and scheme as well, since pagination links are absolute
+        key = f'response:{request.scheme}://{request.get_host()}:{etag}'
+        data = cache.get(key)
+        if data is not None:
+            _count(self.basename, 'hit')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _count(self.basename, 'miss')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, None)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+COLLECTIONS = {
+    Tournament: [CollectionVersion.TOURNAMENTS],
+    GameSchedule: [CollectionVersion.GAME_SCHEDULE],
+    # Teams list shows rosters; users list shows each user's teams and roles
+    # TeamRole writes bump the same two through Team.objects.refresh_rosters(), which their signals call
+    Team: [CollectionVersion.TEAMS, CollectionVersion.USERS],
+    CustomUser: [CollectionVersion.USERS],
+}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_collection_version(sender, **kwargs):
+    # Writes that bypass signals (update, bulk_create, bulk_update) bump explicitly next to the write
+    if sender in COLLECTIONS:
+        CollectionVersion.objects.bump(*COLLECTIONS[sender])
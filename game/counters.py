@@ -0,0 +1,120 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Invitation, Notification, NotificationCursor
+from .routers import primary
+
+
+# Badge counters - unread notifications and pending invitations per user, kept in the cache and
+# adjusted in place on create, accept, decline and mark-read. A missing key is rebuilt with one
+# indexed COUNT on the primary, as a replica that lags would leave the adjusted count off until the
+# timeout; the timeout bounds any drift between workers that do not share a cache.
+COUNTER_TIMEOUT = 60 * 60
+
+UNREAD_KEY = 'badge:notifications:{}'
+BROADCASTS_KEY = 'badge:broadcasts:{}'
+PENDING_KEY = 'badge:invitations:{}'
+LATEST_BROADCAST_KEY = 'badge:latest-broadcast'
+
+
+def _adjust(key, delta):
+    # Only adjusts a counter that is already cached; otherwise the next read recounts it
+    try:
+        if delta > 0:
+            cache.incr(key, delta)
+        elif delta < 0:
+            cache.decr(key, -delta)
+    except ValueError:
+        pass
+
+
+@primary()
+def _latest_broadcast_id():
+    latest = cache.get(LATEST_BROADCAST_KEY)
+    if latest is None:
+        latest = Notification.objects.filter(user__isnull=True).order_by('-id').values_list('id', flat=True).first() or 0
+        cache.add(LATEST_BROADCAST_KEY, latest, COUNTER_TIMEOUT)
+    return latest
+
+
+@primary()
+def unread_broadcasts(user):
+    # Cached together with the newest broadcast it covers, so a new broadcast only recounts the gap
+    latest = _latest_broadcast_id()
+    cached = cache.get(BROADCASTS_KEY.format(user.id))
+    if cached is not None and cached[0] == latest:
+        return cached[1]
+
+    if cached is not None:
+        counted_up_to, count = cached
+    else:
+        counted_up_to = NotificationCursor.objects.filter(user=user).values_list('last_seen_id', flat=True).first() or 0
+        count = 0
+    count += Notification.objects.filter(
+        user__isnull=True, id__gt=counted_up_to, id__lte=latest, created_at__gte=user.date_joined).count()
+    cache.set(BROADCASTS_KEY.format(user.id), (latest, count), COUNTER_TIMEOUT)
+    return count
+
+
+@primary()
+def unread_notifications(user):
+    key = UNREAD_KEY.format(user.id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user=user, is_read=False).count()
+        cache.add(key, count, COUNTER_TIMEOUT)
+    return count
+
+
+@primary()
+def pending_invitations(user):
+    key = PENDING_KEY.format(user.id)
+    count = cache.get(key)
+    if count is None:
+        count = Invitation.objects.filter(receiver=user, status='Pending').count()
+        cache.add(key, count, COUNTER_TIMEOUT)
+    return count
+
+
+def notifications_read(user_id, count):
+    _adjust(UNREAD_KEY.format(user_id), -count)
+
+
+def notification_cursor_moved(user_id):
+    cache.delete(BROADCASTS_KEY.format(user_id))
+
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    if not created:
+        return
+    if instance.is_broadcast:
+        transaction.on_commit(lambda: cache.set(LATEST_BROADCAST_KEY, instance.id, COUNTER_TIMEOUT))
+    elif not instance.is_read:
+        transaction.on_commit(lambda: _adjust(UNREAD_KEY.format(instance.user_id), 1))
+
+
+@receiver(post_delete, sender=Notification)
+def count_deleted_notification(sender, instance, **kwargs):
+    if instance.is_broadcast:
+        transaction.on_commit(lambda: cache.delete(LATEST_BROADCAST_KEY))
+    elif not instance.is_read:
+        transaction.on_commit(lambda: _adjust(UNREAD_KEY.format(instance.user_id), -1))
+
+
+@receiver(post_save, sender=Invitation)
+def count_invitation(sender, instance, created, **kwargs):
+    # Invitation remembers the status it was loaded with, so accept and decline show up as a transition
+    was_pending = not created and instance._loaded_status == 'Pending'
+    is_pending = instance.status == 'Pending'
+    if was_pending != is_pending:
+        delta = 1 if is_pending else -1
+        transaction.on_commit(lambda: _adjust(PENDING_KEY.format(instance.receiver_id), delta))
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=Invitation)
+def count_deleted_invitation(sender, instance, **kwargs):
+    if instance.status == 'Pending':
+        transaction.on_commit(lambda: _adjust(PENDING_KEY.format(instance.receiver_id), -1))
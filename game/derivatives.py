@@ -0,0 +1,107 @@
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+# Image derivatives - small WebP renditions of team logos and match screenshots, rendered in a process pool
+# once an upload is committed. Names follow from the original's name, so a blob shared by many rows is
+# rendered once, and a derivative is ready exactly when its file exists; until then clients get the original.
+DERIVATIVE_PREFIX = 'derivatives'
+VARIANTS = {
+    # variant: (bounding box, WebP quality)
+    'thumbnail': ((128, 128), 80),
+    'webp': ((1280, 1280), 75),
+}
+
+_executor = None
+
+
+def derivative_name(name, variant):
+    return f'{DERIVATIVE_PREFIX}/{os.path.splitext(name)[0]}-{variant}.webp'
+
+
+def derivative_url(file, variant):
+    # URL of the derivative when it has been rendered, otherwise of the original upload
+    if not file:
+        return None
+    name = derivative_name(file.name, variant)
+    return default_storage.url(name) if default_storage.exists(name) else file.url
+
+
+def render(source, targets):
+    # Runs in a pool process, so it only takes filesystem paths: {target path: (box, quality)}.
+    # A rendition that is not smaller than the original is dropped, leaving clients on the original.
+    from PIL import Image, ImageOps
+
+    rendered = []
+    source_size = os.path.getsize(source)
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        for target, (box, quality) in targets.items():
+            rendition = image.copy()
+            rendition.thumbnail(box)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.webp')
+            try:
+                with os.fdopen(fd, 'wb') as temp:
+                    rendition.save(temp, 'WEBP', quality=quality)
+                if os.path.getsize(temp_path) >= source_size:
+                    os.unlink(temp_path)
+                    continue
+                os.replace(temp_path, target)
+                rendered.append(target)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+    return rendered
+
+
+def _announce(rendered):
+    # Serialized image URLs change once renditions exist, so conditional GETs must not keep answering 304
+    from .models import CollectionVersion
+
+    if rendered:
+        CollectionVersion.objects.bump(CollectionVersion.TEAMS, CollectionVersion.GAME_SCHEDULE)
+
+
+def _rendered(future):
+    # Runs on the pool's result thread, which has its own database connection to close
+    from django.db import connection
+
+    if future.exception() is not None:
+        logger.error("Rendering image derivatives failed", exc_info=future.exception())
+        return
+    try:
+        _announce(future.result())
+    finally:
+        connection.close()
+
+
+def schedule(names):
+    # Submits the missing derivatives of each stored image; with DERIVATIVE_WORKERS = 0 they render inline
+    global _executor
+    workers = getattr(settings, 'DERIVATIVE_WORKERS', 2)
+    for name in set(filter(None, names)):
+        targets = {default_storage.path(derivative_name(name, variant)): spec for variant, spec in VARIANTS.items()
+                   if not default_storage.exists(derivative_name(name, variant))}
+        if not targets or not default_storage.exists(name):
+            continue
+        if not workers:
+            try:
+                _announce(render(default_storage.path(name), targets))
+            except Exception:
+                logger.exception("Rendering image derivatives of %s failed", name)
+            continue
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=workers)
+        _executor.submit(render, default_storage.path(name), targets).add_done_callback(_rendered)
+
+
+def delete(name):
+    for variant in VARIANTS:
+        default_storage.delete(derivative_name(name, variant))
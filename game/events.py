@@ -0,0 +1,79 @@
+import asyncio
+import threading
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import Notification
+
+
+# In-process pub/sub for notification events. Every streaming connection owns a bounded asyncio queue
+# registered under its user id; publishing is thread-safe, so sync code (signals, WSGI views)
+# can hand events to the event loop that serves the streams.
+class Subscription:
+    def __init__(self, user_id, maxsize=100):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        # Set when events were dropped; the stream then replays from the database
+        self.overflowed = False
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class NotificationBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.user_id, None)
+
+    def publish(self, user_id, event):
+        # A user_id of None is a broadcast and reaches every connected user
+        with self._lock:
+            if user_id is None:
+                targets = [s for subscriptions in self._subscriptions.values() for s in subscriptions]
+            else:
+                targets = list(self._subscriptions.get(user_id, ()))
+        for subscription in targets:
+            subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+
+    @property
+    def connections(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+broker = NotificationBroker()
+
+
+def notification_event(notification):
+    return {
+        'id': notification.id,
+        'user': notification.user_id,
+        'message': notification.message,
+        'created_at': notification.created_at.isoformat(),
+        'broadcast': notification.is_broadcast,
+    }
+
+
+@receiver(post_save, sender=Notification)
+def publish_notification(sender, instance, created, **kwargs):
+    # Published after commit, so streams never announce a row readers cannot see yet
+    if created:
+        event = notification_event(instance)
+        transaction.on_commit(lambda: broker.publish(instance.user_id, event))
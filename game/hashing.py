@@ -0,0 +1,36 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+
+
+# Password hashing pool - PBKDF2 runs in a few dedicated threads (hashlib releases the GIL while it
+# works) so request handlers stay free. `backlog` bounds how many more may wait for a thread; past that
+# callers get PoolSaturated at once instead of queueing behind a login surge.
+class PoolSaturated(Exception):
+    pass
+
+
+class HashingPool:
+    def __init__(self, workers, backlog):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hashing')
+        self.slots = threading.BoundedSemaphore(workers + backlog)
+
+    async def run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            raise PoolSaturated
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return await asyncio.wrap_future(future)
+
+
+hashing_pool = HashingPool(
+    getattr(settings, 'PASSWORD_HASHING_WORKERS', None) or os.cpu_count() or 2,
+    getattr(settings, 'PASSWORD_HASHING_BACKLOG', 32),
+)
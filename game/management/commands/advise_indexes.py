@@ -0,0 +1,117 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+from game.models import CustomUser, Team, TeamRole, Tournament
+
+# Caches would hide the queries being examined
+NO_CACHES = {alias: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'} for alias in settings.CACHES}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Replay the API endpoints, run their queries under EXPLAIN QUERY PLAN and flag full table scans '
+            'and temporary B-trees (SQLite)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to replay the endpoints as (default: the user with the most team roles)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per endpoint')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the plan of every query, not only flagged ones')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("EXPLAIN QUERY PLAN output is only understood for SQLite.")
+        user = self.pick_user(options['user'])
+        client = APIClient()
+        client.force_authenticate(user)
+
+        flagged = 0
+        with override_settings(CACHES=NO_CACHES, ALLOWED_HOSTS=['*']):
+            for method, url, data in self.endpoints(user):
+                response, queries, _ = self.replay(client, method, url, data)
+                repeat = max(options['repeat'], 1)
+                elapsed = sum(self.replay(client, method, url, data)[2] for _ in range(repeat)) / repeat
+                self.stdout.write(f"{method.upper()} {url} -> {response.status_code}: "
+                                  f"{len(queries)} queries, {elapsed * 1000:.2f}ms")
+                flagged += self.explain(queries, options['verbose_plans'])
+        self.stdout.write(f"{flagged} flagged query plan(s)")
+
+    def pick_user(self, username):
+        if username:
+            try:
+                return CustomUser.objects.get(username=username)
+            except CustomUser.DoesNotExist:
+                raise CommandError(f"No user {username}.")
+        user = CustomUser.objects.order_by('-team_roles__id').first() or CustomUser.objects.first()
+        if user is None:
+            raise CommandError("The database has no users to replay the endpoints with.")
+        return user
+
+    def endpoints(self, user):
+        team = Team.objects.filter(roles__member=user).first() or Team.objects.first()
+        tournament = Tournament.objects.order_by('-id').first()
+        yield 'get', '/api/teams_list/', None
+        yield 'get', '/api/users_list/', None
+        yield 'get', '/api/teams/', None
+        yield 'get', '/api/invitation/', None
+        yield 'get', '/api/invitation/pending_count/', None
+        yield 'get', '/api/notification/', None
+        yield 'get', '/api/notification/unread_count/', None
+        yield 'get', '/api/tournaments/', None
+        yield 'get', '/api/tournament-registrations/', None
+        yield 'get', '/api/game_schedule/', None
+        if tournament is not None:
+            yield 'get', f'/api/tournaments/{tournament.id}/standings/', None
+            entry = tournament.games.order_by('-rank').first()
+            yield 'get', f'/api/tournaments/{tournament.id}/leaderboard/' + (f'?team={entry.team_id}' if entry else ''), None
+        if team is not None:
+            receiver = CustomUser.objects.exclude(team_roles__team=team).exclude(pk=user.pk).first()
+            # A free role makes the whole validation path run; any role still replays its first checks
+            taken = set(TeamRole.objects.filter(team=team).values_list('role', flat=True))
+            taken.update(team.invitations.filter(status__in=['Pending', 'Accepted']).values_list('role', flat=True))
+            roles = [role for role, _ in TeamRole.MAIN_ROLE_CHOICES + TeamRole.SUB_ROLE_CHOICES]
+            role = next((role for role in roles if role not in taken), roles[-1])
+            if receiver is not None:
+                yield 'post', '/api/invitation/', {'receiver': receiver.id, 'team': team.id, 'role': role}
+
+    def replay(self, client, method, url, data):
+        # Every run is rolled back, so a write is replayed - and timed - from the same state each time
+        try:
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url, data, format='json')
+                    elapsed = time.perf_counter() - started
+                raise Rollback
+        except Rollback:
+            pass
+        return response, list(context.captured_queries), elapsed
+
+    def explain(self, queries, verbose):
+        flagged = 0
+        seen = set()
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or sql in seen:
+                continue
+            seen.add(sql)
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+            # A page walked in rowid order (cursor pagination: ORDER BY id LIMIT n, no WHERE) stops early,
+            # so only scans that filter or read everything are flagged
+            walk = ' LIMIT ' in sql and ' WHERE ' not in sql
+            problems = [step for step in plan if (step.startswith('SCAN ') and ' USING ' not in step and not walk
+                                                  and not step.startswith('SCAN CONSTANT ROW')) or 'TEMP B-TREE' in step]
+            if problems:
+                flagged += 1
+            if problems or verbose:
+                self.stdout.write(f"  {'FLAG' if problems else 'ok'}: {sql[:200]}")
+                for step in plan:
+                    self.stdout.write(f"      {step}")
+        return flagged
@@ -0,0 +1,64 @@
+import asyncio
+import json
+import time
+import uuid
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.test import AsyncRequestFactory
+from game.hashing import HashingPool
+from game.models import CustomUser
+from game.views import LoginAPIView
+
+
+class Command(BaseCommand):
+    help = 'Fire concurrent logins at the async login view and report throughput, latency and shed requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200, help='Logins attempted')
+        parser.add_argument('--concurrency', type=int, default=50, help='Logins in flight at once')
+        parser.add_argument('--workers', type=int, help='Hashing threads (default: PASSWORD_HASHING_WORKERS)')
+        parser.add_argument('--backlog', type=int, default=32, help='Hashes allowed to wait for a thread')
+
+    def handle(self, *args, **options):
+        # Throwaway users sharing one hash, removed again at the end
+        run = uuid.uuid4().hex[:8]
+        password = 'benchmark-pass'
+        encoded = make_password(password)
+        users = CustomUser.objects.bulk_create([
+            CustomUser(username=f'login-{run}-{i}@example.com', in_game_name=f'l{run}{i}', full_name='Benchmark login', password=encoded)
+            for i in range(options['logins'])
+        ])
+        try:
+            results = asyncio.run(self.run_logins(users, password, options))
+        finally:
+            CustomUser.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+        elapsed, latencies, codes = results
+        ok = sorted(latency for latency, code in zip(latencies, codes) if code == 200)
+        shed = codes.count(503)
+        self.stdout.write(f"{len(ok)} logins in {elapsed:.2f}s: {len(ok) / elapsed:.1f} logins/sec, {shed} shed with 503, "
+                          f"{len(codes) - len(ok) - shed} failed")
+        if ok:
+            self.stdout.write(f"latency p50 {ok[len(ok) // 2] * 1000:.0f}ms, p95 {ok[int(len(ok) * 0.95)] * 1000:.0f}ms")
+
+    async def run_logins(self, users, password, options):
+        from game import views
+
+        if options['workers']:
+            views.hashing_pool = HashingPool(options['workers'], options['backlog'])
+        factory = AsyncRequestFactory()
+        view = LoginAPIView.as_view()
+        limit = asyncio.Semaphore(options['concurrency'])
+
+        async def login(user):
+            async with limit:
+                request = factory.post('/login/', json.dumps({'username': user.username, 'password': password}),
+                                       content_type='application/json')
+                started = time.perf_counter()
+                response = await view(request)
+                return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(login(user) for user in users))
+        elapsed = time.perf_counter() - started
+        return elapsed, [latency for latency, _ in outcomes], [code for _, code in outcomes]
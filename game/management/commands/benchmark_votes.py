@@ -0,0 +1,67 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.utils import timezone
+from game.buffers import VoteBuffer
+from game.models import CustomUser, Team, Tournament, GameSchedule, Vote
+
+
+class Command(BaseCommand):
+    help = 'Compare votes/sec of the per-request vote path with the write-behind buffer on one hot match'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--votes', type=int, default=2000, help='Votes cast per mode')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent voters')
+        parser.add_argument('--interval', type=float, default=0.1, help='Flush interval of the buffer in seconds')
+
+    def handle(self, *args, **options):
+        # Throwaway fixtures, removed again at the end
+        run = uuid.uuid4().hex[:8]
+        users = CustomUser.objects.bulk_create([
+            CustomUser(username=f'bench-{run}-{i}@example.com', in_game_name=f'b{run}{i}', full_name='Benchmark voter')
+            for i in range(options['votes'])
+        ])
+        teams = Team.objects.bulk_create([Team(creator=users[0], name=f'bench-{run}-{side}') for side in (1, 2)])
+        now = timezone.now()
+        tournament = Tournament.objects.create(title=f'bench-{run}', start_time=now, end_time=now)
+        try:
+            for mode in ('per-request', 'write-behind'):
+                game = GameSchedule.objects.create(tournament=tournament, time=now, team_1=teams[0], team_2=teams[1])
+                elapsed, errors = self.run_mode(mode, game, users, options)
+                game.refresh_from_db()
+                ledger = Vote.objects.filter(game=game).count()
+                self.stdout.write(
+                    f"{mode:>12}: {len(users) / elapsed:10.1f} votes/sec  ({elapsed:.2f}s, {errors} errors, "
+                    f"tally {game.vote}, ledger {ledger})")
+                if game.vote != ledger or game.votes_team_1 + game.votes_team_2 != ledger:
+                    self.stderr.write(f"{mode}: tallies do not match the ledger")
+        finally:
+            tournament.delete()
+            Team.objects.filter(pk__in=[team.pk for team in teams]).delete()
+            CustomUser.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def run_mode(self, mode, game, users, options):
+        buffer = VoteBuffer(options['interval']) if mode == 'write-behind' else None
+
+        def vote(user):
+            try:
+                team = 1 + user.pk % 2
+                if buffer:
+                    buffer.add(game.pk, user.pk, team)
+                else:
+                    Vote.objects.cast(game.pk, user.pk, team)
+                return 0
+            except OperationalError:
+                return 1
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            errors = sum(executor.map(vote, users))
+        if buffer:
+            # Time until everything is durable, not just acknowledged
+            buffer.flush()
+        return time.perf_counter() - started, errors
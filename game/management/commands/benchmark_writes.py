@@ -0,0 +1,83 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+
+PROFILES = ('stock', 'tuned')
+
+
+class Command(BaseCommand):
+    help = ('Compare write transactions/sec of the stock SQLite backend with the game.sqlite concurrency profile '
+            '(WAL, tuned PRAGMAs, IMMEDIATE transactions) under concurrent writers')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent writers')
+        parser.add_argument('--transactions', type=int, default=2000, help='Write transactions per profile')
+        parser.add_argument('--persistent', action='store_true',
+                            help='Keep one connection per writer instead of reconnecting for every transaction')
+
+    def handle(self, *args, **options):
+        default = connections.settings['default']
+        if default['ENGINE'] != 'game.sqlite':
+            raise CommandError("The default database is not using the game.sqlite backend.")
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in PROFILES:
+                alias = f'benchmark_{profile}'
+                # Each profile writes to its own scratch file, shaped like the vote path: a ledger row and a tally
+                connections.settings[alias] = {
+                    **default,
+                    'NAME': os.path.join(directory, f'{profile}.sqlite3'),
+                    'ENGINE': 'django.db.backends.sqlite3' if profile == 'stock' else 'game.sqlite',
+                    'OPTIONS': {} if profile == 'stock' else settings.DATABASES['default']['OPTIONS'],
+                }
+                try:
+                    self.prepare(alias)
+                    elapsed, errors = self.run_profile(alias, options)
+                    with connections[alias].cursor() as cursor:
+                        cursor.execute('SELECT COUNT(*) FROM bench_ledger')
+                        ledger = cursor.fetchone()[0]
+                        cursor.execute('SELECT total FROM bench_tally')
+                        tally = cursor.fetchone()[0]
+                    self.stdout.write(
+                        f"{profile:>5}: {ledger / elapsed:10.1f} committed/sec  ({elapsed:.2f}s, "
+                        f"{errors} errors, ledger {ledger}, tally {tally})")
+                    if ledger != tally:
+                        self.stderr.write(f"{profile}: tally does not match the ledger")
+                finally:
+                    connections[alias].close()
+                    del connections[alias]
+                    del connections.settings[alias]
+
+    def prepare(self, alias):
+        with connections[alias].cursor() as cursor:
+            cursor.execute('CREATE TABLE bench_ledger (id INTEGER PRIMARY KEY, writer INTEGER, payload TEXT)')
+            cursor.execute('CREATE TABLE bench_tally (id INTEGER PRIMARY KEY, total INTEGER NOT NULL)')
+            cursor.execute('INSERT INTO bench_tally (id, total) VALUES (1, 0)')
+
+    def run_profile(self, alias, options):
+        persistent = options['persistent']
+
+        def write(index):
+            try:
+                # Read, then write: a deferred transaction upgrades its lock at the INSERT and fails
+                # if another writer committed in between
+                with transaction.atomic(using=alias):
+                    with connections[alias].cursor() as cursor:
+                        cursor.execute('SELECT total FROM bench_tally WHERE id = 1')
+                        cursor.fetchone()
+                        cursor.execute('INSERT INTO bench_ledger (writer, payload) VALUES (%s, %s)', [index, 'x' * 200])
+                        cursor.execute('UPDATE bench_tally SET total = total + 1 WHERE id = 1')
+                return 0
+            except OperationalError:
+                return 1
+            finally:
+                if not persistent:
+                    connections[alias].close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            errors = sum(executor.map(write, range(options['transactions'])))
+        return time.perf_counter() - started, errors
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from game import derivatives
+from game.models import Team, GameSchedule
+
+
+class Command(BaseCommand):
+    help = 'Render missing thumbnails and WebP versions of every stored team logo and match screenshot'
+
+    def handle(self, *args, **options):
+        names = set()
+        for model in (Team, GameSchedule):
+            for field in model.BLOB_FIELDS:
+                names.update(model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list(field, flat=True).distinct())
+        self.stdout.write(f"Checking derivatives of {len(names)} image(s)")
+        derivatives.schedule(names)
+        if derivatives._executor is not None:
+            # Wait for the pool, so the command exits once everything is rendered
+            derivatives._executor.shutdown(wait=True)
+        self.stdout.write("Done")
@@ -1,39 +1,102 @@
-from django.core.management.base import BaseCommand
+import time
+from datetime import timedelta
+from itertools import islice
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
-from game.models import Tournament, GameSchedule
-import random
+from game.models import CollectionVersion, Tournament, TournamentRegistration, GameSchedule
+from game.scheduling import round_robin, round_robin_size, single_elimination, swiss_round, swiss_history
+
+BATCH_SIZE = 1000
+FORMATS = ('round-robin', 'swiss', 'single-elimination')
+
 
 class Command(BaseCommand):
-    help = 'Generate game schedules for tournaments'
+    help = 'Generate game schedules for tournaments from their registered teams'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tournament', type=int, action='append', help='Only schedule this tournament id (repeatable)')
+        parser.add_argument('--format', choices=FORMATS, default='round-robin',
+                            help='round-robin schedules every round; swiss and single-elimination add the next '
+                                 'round once every game of the previous one has a finalized result')
+        parser.add_argument('--interval', type=int, default=60, help='Minutes between rounds')
+        parser.add_argument('--replace', action='store_true', help='Delete existing fixtures of the tournament first')
+        parser.add_argument('--dry-run', action='store_true', help='Report fixture counts and timings without writing')
 
-    @transaction.atomic
     def handle(self, *args, **options):
-        # Iterate over all tournaments or filter as needed
-        for tournament in Tournament.objects.all():
+        tournaments = Tournament.objects.order_by('id')
+        if options['tournament']:
+            tournaments = tournaments.filter(id__in=options['tournament'])
+            if not tournaments.exists():
+                raise CommandError("No tournament matches --tournament.")
+
+        for tournament in tournaments:
             self.stdout.write(f"Processing {tournament.title}")
+            self.schedule(tournament, options)
+            self.stdout.write(f"Finished scheduling games for {tournament.title}")
 
-            # Fetch all registered teams for the tournament
-            registered_teams = list(tournament.teams.all())
-            
-            # Ensure there is an even number of teams
-            if len(registered_teams) % 2 != 0:
-                self.stdout.write("Odd number of teams, one team will not be scheduled.")
-                registered_teams.pop()  # Remove one team, or handle differently
-
-            # Shuffle teams to randomize matchups
-            random.shuffle(registered_teams)
-
-            # Create game schedules
-            for i in range(0, len(registered_teams), 2):
-                team_1 = registered_teams[i]
-                team_2 = registered_teams[i + 1]
-                
-                # # Create a GameSchedule instance for each pair
-                # GameSchedule.objects.create(
-                #     tournament=tournament,
-                #     time=random.choice([time for time in a predefined time list]),  # Placeholder, define your logic
-                #     team_1=team_1,
-                #     team_2=team_2
-                # )
+    def schedule(self, tournament, options):
+        # Registration order is the seed order; a team registered twice is seeded once
+        team_ids = list(dict.fromkeys(TournamentRegistration.objects.filter(
+            tournament=tournament).order_by('created_time', 'id').values_list('team_id', flat=True)))
+        if len(team_ids) < 2:
+            self.stdout.write("Fewer than two registered teams, nothing to schedule.")
+            return
 
-            self.stdout.write(f"Finished scheduling games for {tournament.title}")
+        existing = GameSchedule.objects.filter(tournament=tournament)
+        if options['format'] == 'round-robin' and not (options['replace'] or options['dry_run']) and existing.exists():
+            self.stdout.write("Fixtures already exist, skipping (use --replace to regenerate).")
+            return
+        progressive = options['format'] != 'round-robin' and not options['replace']
+        if progressive and existing.filter(winner_updated=False).exists():
+            raise CommandError("The previous round has games without a finalized result (see finalize_results).")
+        history = existing.values_list('round', 'team_1_id', 'team_2_id', 'score_team_1', 'score_team_2') if progressive else []
+
+        started = time.perf_counter()
+        if options['format'] == 'round-robin':
+            fixtures = round_robin(team_ids)
+            expected = round_robin_size(len(team_ids))
+        elif options['format'] == 'single-elimination':
+            try:
+                # Generated up front, so a bracket without a winner fails before anything is written
+                fixtures = iter(list(single_elimination(team_ids, history)))
+            except ValueError as error:
+                raise CommandError(str(error))
+            expected = None
+        else:
+            points, played, had_bye, last_round = swiss_history(team_ids, history)
+            fixtures = swiss_round(team_ids, points, played, had_bye, last_round + 1)
+            expected = len(team_ids) // 2
+
+        interval = timedelta(minutes=options['interval'])
+        count = 0
+        rounds = set()
+        with transaction.atomic():
+            if options['replace'] and not options['dry_run']:
+                existing.delete()
+            # Fixtures are streamed into fixed-size bulk inserts, so memory does not grow with the field
+            while batch := list(islice(fixtures, BATCH_SIZE)):
+                count += len(batch)
+                rounds.update(round_number for round_number, _, _ in batch)
+                if not options['dry_run']:
+                    GameSchedule.objects.bulk_create([
+                        GameSchedule(tournament=tournament, round=round_number, team_1_id=team_1, team_2_id=team_2,
+                                     time=tournament.start_time + (round_number - 1) * interval)
+                        for round_number, team_1, team_2 in batch
+                    ])
+            if expected is not None and count != expected:
+                raise CommandError(f"Generated {count} fixtures, expected {expected}.")
+            if count and not options['dry_run']:
+                # bulk_create sends no signals
+                CollectionVersion.objects.bump(CollectionVersion.GAME_SCHEDULE)
+        elapsed = time.perf_counter() - started
+        if not count:
+            self.stdout.write("The bracket is complete, nothing to schedule.")
+            return
+
+        # Every team appears once per round, either in a fixture or on a bye; after the opening round of a
+        # knockout the teams left out have been eliminated rather than given a bye
+        byes = len(team_ids) * len(rounds) - 2 * count if rounds == {1} or options['format'] != 'single-elimination' else 0
+        action = "Would create" if options['dry_run'] else "Created"
+        self.stdout.write(
+            f"{action} {count} {options['format']} fixtures over {len(rounds)} round(s) for {len(team_ids)} teams "
+            f"with {byes} bye(s) in {elapsed:.2f}s")
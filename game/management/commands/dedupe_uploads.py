@@ -0,0 +1,60 @@
+import hashlib
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from game.models import Blob, CollectionVersion, Team, GameSchedule
+from game.storage import is_blob_name
+
+MODELS = (Team, GameSchedule)
+
+
+class Command(BaseCommand):
+    help = 'Move uploads stored before content addressing into blobs, keeping one file per distinct content'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report the space that would be saved without changing anything')
+
+    def handle(self, *args, **options):
+        # Every legacy file name still referenced, with the (model, field) pairs that point at it
+        references = {}
+        for model in MODELS:
+            for field in model.BLOB_FIELDS:
+                for name in model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list(field, flat=True).distinct():
+                    if not is_blob_name(name):
+                        references.setdefault(name, set()).add((model, field))
+
+        digests = {}
+        missing = 0
+        total = 0
+        for name in sorted(references):
+            if not default_storage.exists(name):
+                missing += 1
+                continue
+            digest = hashlib.sha256()
+            with default_storage.open(name) as content:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+            digests[name] = digest.hexdigest()
+            total += default_storage.size(name)
+
+        unique = {}
+        for name, digest in digests.items():
+            unique.setdefault(digest, name)
+        saved = total - sum(default_storage.size(name) for name in unique.values())
+        action = "Would move" if options['dry_run'] else "Moved"
+        self.stdout.write(f"{action} {len(digests)} file(s) into {len(unique)} blob(s), saving {saved} bytes"
+                          f"{f'; {missing} referenced file(s) are missing' if missing else ''}")
+        if options['dry_run']:
+            return
+
+        for name in digests:
+            with default_storage.open(name) as content:
+                blob = default_storage.save(name, content)
+            with transaction.atomic():
+                rows = 0
+                for model, field in references[name]:
+                    rows += model.objects.filter(**{field: name}).update(**{field: blob})
+                Blob.objects.acquire([blob] * rows)
+                CollectionVersion.objects.bump(CollectionVersion.TEAMS, CollectionVersion.GAME_SCHEDULE)
+            # Django never removed replaced uploads, so the legacy file is only referenced by the rows just moved
+            default_storage.delete(name)
@@ -0,0 +1,20 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from game.models import GameSchedule
+
+
+class Command(BaseCommand):
+    help = 'Count the results of finished games into the tournament standings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tournament', type=int, action='append', help='Only finalize games of this tournament id (repeatable)')
+        parser.add_argument('--hours', type=int, default=48, help='Games older than this many hours are finished')
+
+    def handle(self, *args, **options):
+        games = GameSchedule.objects.filter(winner_updated=False, time__lte=timezone.now() - timedelta(hours=options['hours']))
+        if options['tournament']:
+            games = games.filter(tournament_id__in=options['tournament'])
+
+        count = sum(game.finalize_result() for game in games.order_by('id').iterator())
+        self.stdout.write(f"Finalized {count} game(s)")
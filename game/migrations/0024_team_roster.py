@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:24
+
+from django.db import migrations, models
+
+
+def backfill_roster(apps, schema_editor):
+    Team = apps.get_model('game', 'Team')
+    TeamRole = apps.get_model('game', 'TeamRole')
+    rosters = {}
+    for team_role in TeamRole.objects.select_related('member').order_by('id'):
+        rosters.setdefault(team_role.team_id, []).append({
+            'member_id': team_role.member_id,
+            'in_game_name': team_role.member.in_game_name,
+            'role': team_role.role,
+        })
+    teams = list(Team.objects.all())
+    for team in teams:
+        team.roster = rosters.get(team.id, [])
+    Team.objects.bulk_update(teams, ['roster'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0023_notification_is_read'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='roster',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(backfill_roster, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def copy_voters(apps, schema_editor):
+    # Earlier votes only recorded who voted, so they enter the ledger without a team
+    GameSchedule = apps.get_model('game', 'GameSchedule')
+    Vote = apps.get_model('game', 'Vote')
+    Vote.objects.bulk_create([
+        Vote(game_id=voter.gameschedule_id, user_id=voter.customuser_id)
+        for voter in GameSchedule.vote_updated_by.through.objects.all()
+    ], batch_size=500)
+    # The old counter was set by clients; from here on it is the number of ledger rows
+    GameSchedule.objects.update(vote=Coalesce(Subquery(
+        Vote.objects.filter(game=OuterRef('pk')).values('game').annotate(voters=Count('id')).values('voters')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0024_team_roster'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameschedule',
+            name='votes_team_1',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='gameschedule',
+            name='votes_team_2',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='Vote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('team', models.PositiveSmallIntegerField(blank=True, choices=[(1, 'Team 1'), (2, 'Team 2')], null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='votes', to='game.gameschedule')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='votes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('game', 'user')},
+            },
+        ),
+        migrations.RunPython(copy_voters, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='gameschedule',
+            name='vote_updated_by',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0025_vote_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameschedule',
+            name='round',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
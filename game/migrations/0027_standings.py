@@ -0,0 +1,44 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+
+def reset_standings(apps, schema_editor):
+    # Rows written by the old read path hold unreliable counts and may be duplicated. No result has been
+    # finalized yet, so every team starts from one zeroed row; finalize_results counts past games in again.
+    Game = apps.get_model('game', 'Game')
+    seen = set()
+    duplicates = []
+    for pk, tournament_id, team_id in Game.objects.order_by('id').values_list('id', 'tournament_id', 'team_id').iterator():
+        if (tournament_id, team_id) in seen:
+            duplicates.append(pk)
+        seen.add((tournament_id, team_id))
+    Game.objects.filter(pk__in=duplicates).delete()
+    Game.objects.update(score=0, win=0, lost=0, total_game=0)
+    TournamentRegistration = apps.get_model('game', 'TournamentRegistration')
+    registered = set(TournamentRegistration.objects.values_list('tournament_id', 'team_id'))
+    Game.objects.bulk_create([Game(tournament_id=tournament_id, team_id=team_id) for tournament_id, team_id in registered - seen])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0026_gameschedule_round'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gameschedule',
+            name='winner_updated',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(reset_standings, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='game',
+            unique_together={('tournament', 'team')},
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['tournament', '-win', '-score', 'lost', 'team'], name='game_standings_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:34
+
+from django.db import migrations, models
+
+
+def rank_standings(apps, schema_editor):
+    Game = apps.get_model('game', 'Game')
+    games = list(Game.objects.order_by('tournament_id', '-win', '-score', 'lost', 'team_id').only('id', 'tournament_id'))
+    tournament_id = position = None
+    for game in games:
+        if game.tournament_id != tournament_id:
+            tournament_id, position = game.tournament_id, 0
+        position += 1
+        game.rank = position
+    Game.objects.bulk_update(games, ['rank'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0027_standings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='rank',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='standings_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['tournament', 'rank'], name='game_rank_idx'),
+        ),
+        migrations.RunPython(rank_standings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_versions(apps, schema_editor):
+    CollectionVersion = apps.get_model('game', 'CollectionVersion')
+    CollectionVersion.objects.bulk_create([
+        CollectionVersion(name=name, version=1) for name in ('tournaments', 'game_schedule', 'teams')
+    ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0029_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionVersion',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:58
+
+from django.db import migrations
+
+
+def create_version(apps, schema_editor):
+    CollectionVersion = apps.get_model('game', 'CollectionVersion')
+    CollectionVersion.objects.bulk_create([CollectionVersion(name='users', version=1)], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0030_collection_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0031_users_collection_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gameschedule',
+            index=models.Index(fields=['tournament', 'time'], name='gameschedule_fixtures_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invitation',
+            index=models.Index(fields=['receiver', 'team', 'status'], name='invitation_receiver_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invitation',
+            index=models.Index(fields=['team', 'role', 'status'], name='invitation_team_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'created_at'], name='notification_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teamrole',
+            index=models.Index(fields=['team', 'role'], name='teamrole_team_role_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.2 on 2026-10-18 14:06
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def rerank_standings(apps, schema_editor):
+    # Ties are now broken by registration order instead of team id
+    Game = apps.get_model('game', 'Game')
+    Tournament = apps.get_model('game', 'Tournament')
+    games = list(Game.objects.order_by('tournament_id', '-win', '-score', 'lost', 'id').only('id', 'tournament_id', 'rank'))
+    tournament_id = position = None
+    changed = []
+    for game in games:
+        if game.tournament_id != tournament_id:
+            tournament_id, position = game.tournament_id, 0
+        position += 1
+        if game.rank != position:
+            game.rank = position
+            changed.append(game)
+    Game.objects.bulk_update(changed, ['rank'], batch_size=500)
+    Tournament.objects.filter(pk__in={game.tournament_id for game in changed}).update(standings_version=F('standings_version') + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0032_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='game',
+            name='game_standings_idx',
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['tournament', '-win', '-score', 'lost', 'id'], name='game_standings_idx'),
+        ),
+        migrations.RunPython(rerank_standings, migrations.RunPython.noop),
+    ]
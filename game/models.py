@@ -1,31 +1,169 @@
-from django.db import models
+from collections import Counter
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.core.files.storage import default_storage
 from django.contrib.auth.models import AbstractUser
-from django.forms import ValidationError
 from django.utils import timezone
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from .storage import is_blob_name
+from . import derivatives
 
 # CustomUser - add in_game_name as required field and full-name field 
 class CustomUser(AbstractUser):
     in_game_name = models.CharField(max_length=20, unique=True, verbose_name="ingame name")
     full_name = models.CharField(max_length=100, verbose_name="full name") 
 
+    # In-game name as loaded from the database, so a rename can refresh the roster snapshots
+    _loaded_in_game_name = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'in_game_name' in field_names:
+            instance._loaded_in_game_name = values[field_names.index('in_game_name')]
+        return instance
+
     def __str__(self):
         return self.username
 
-    
+
+# Collection versions - one row per polled collection, bumped with every change to its rows. Conditional
+# GETs (see game.caching) are validated against it without loading the collection itself.
+class CollectionVersionQuerySet(models.QuerySet):
+    def bump(self, *names):
+        bumped = CollectionVersion.objects.filter(name__in=names).update(version=F('version') + 1, updated_at=timezone.now())
+        if bumped < len(set(names)):
+            CollectionVersion.objects.bulk_create([CollectionVersion(name=name, version=1) for name in names], ignore_conflicts=True)
+
+
+class CollectionVersion(models.Model):
+    TOURNAMENTS = 'tournaments'
+    GAME_SCHEDULE = 'game_schedule'
+    TEAMS = 'teams'
+    USERS = 'users'
+    # Live vote tallies of the schedule, bumped at most once per VOTE_VERSION_INTERVAL (see game.buffers)
+    VOTES = 'votes'
+
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    objects = CollectionVersionQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+# Blobs - files in content-addressed storage, counted by the model fields that point at them
+class BlobQuerySet(models.QuerySet):
+    def acquire(self, names):
+        counts = Counter(name for name in names if is_blob_name(name))
+        Blob.objects.bulk_create([Blob(name=name) for name in counts], ignore_conflicts=True)
+        for name, count in counts.items():
+            Blob.objects.filter(name=name).update(refs=F('refs') + count)
+
+    def release(self, names):
+        counts = Counter(name for name in names if is_blob_name(name))
+        for name, count in counts.items():
+            Blob.objects.filter(name=name).update(refs=Greatest(F('refs') - count, 0))
+        orphans = list(Blob.objects.filter(name__in=counts, refs=0).values_list('name', flat=True))
+        if not orphans:
+            return
+        Blob.objects.filter(name__in=orphans, refs=0).delete()
+
+        # The file goes once the release is committed, unless an upload claimed the blob again meanwhile
+        def delete_files():
+            for name in set(orphans) - set(Blob.objects.filter(name__in=orphans).values_list('name', flat=True)):
+                default_storage.delete(name)
+                derivatives.delete(name)
+        transaction.on_commit(delete_files)
+
+
+class Blob(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    refs = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = BlobQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.name} ({self.refs} references)"
+
+
+class BlobFieldsMixin:
+    # File fields stored as blobs, and their names as loaded, so replacing a file moves the counts.
+    # A field deferred when the row was loaded is not tracked on that instance.
+    BLOB_FIELDS = ()
+    _loaded_blobs = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_blobs = {
+            field: values[field_names.index(field)] or '' for field in cls.BLOB_FIELDS if field in field_names}
+        return instance
+
+
 # Team
-class Team(models.Model):
+class TeamQuerySet(models.QuerySet):
+    # Roster mutation service - recomputes roster, member_count and status for every team in the queryset
+    # from one query over their roles, then writes only those columns. Returns {team_id: values}.
+    def refresh_rosters(self):
+        team_ids = list(self.values_list('pk', flat=True))
+        if not team_ids:
+            return {}
+
+        rosters = {team_id: [] for team_id in team_ids}
+        for team_id, member_id, in_game_name, role in TeamRole.objects.filter(team__in=team_ids).order_by('id').values_list(
+                'team_id', 'member_id', 'member__in_game_name', 'role'):
+            rosters[team_id].append({'member_id': member_id, 'in_game_name': in_game_name, 'role': role})
+
+        main_roles = dict(TeamRole.MAIN_ROLE_CHOICES)
+        teams = [Team(
+            pk=team_id,
+            roster=roster,
+            member_count=len(roster),
+            # A team is complete once it holds all five main roles
+            status=len({entry['role'] for entry in roster if entry['role'] in main_roles}) == len(main_roles),
+        ) for team_id, roster in rosters.items()]
+        Team.objects.bulk_update(teams, ['roster', 'member_count', 'status'])
+        CollectionVersion.objects.bump(CollectionVersion.TEAMS, CollectionVersion.USERS)
+        return {team.pk: {'roster': team.roster, 'member_count': team.member_count, 'status': team.status} for team in teams}
+
+
+class Team(BlobFieldsMixin, models.Model):
     creator = models.ForeignKey(CustomUser, related_name='created_teams', on_delete=models.CASCADE)
     name = models.CharField(max_length=100, unique=True)
     logo = models.ImageField(upload_to='team_logos/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.BooleanField(default=False, verbose_name="Is Complete")
     member_count = models.IntegerField(default=1)
+    # Denormalized [{'member_id', 'in_game_name', 'role'}, ...] kept in step with TeamRole, so reads need no joins
+    roster = models.JSONField(default=list, blank=True)
+
+    objects = TeamQuerySet.as_manager()
+
+    BLOB_FIELDS = ('logo',)
 
     def __str__(self):
         return self.name
 
+    @property
+    def roster_creator_role(self):
+        return next((entry['role'] for entry in self.roster if entry['member_id'] == self.creator_id), None)
+
+
+class TeamRoleQuerySet(models.QuerySet):
+    # Bulk role assignment - signals do not fire for bulk_create, so the affected rosters are refreshed here.
+    # Duplicate roles are rejected by the unique constraint and roll the whole batch back.
+    def assign(self, team_roles):
+        with transaction.atomic():
+            created = self.bulk_create(team_roles)
+            Team.objects.filter(pk__in={team_role.team_id for team_role in created}).refresh_rosters()
+        return created
+
 
 class TeamRole(models.Model):
     MAIN_ROLE_CHOICES = (
@@ -43,32 +181,34 @@ class TeamRole(models.Model):
     member = models.ForeignKey(CustomUser, related_name='team_roles', on_delete=models.CASCADE)
     role = models.CharField(max_length=20, choices=MAIN_ROLE_CHOICES + SUB_ROLE_CHOICES)
 
+    objects = TeamRoleQuerySet.as_manager()
+
     class Meta:
         unique_together = ('team', 'member', 'role')
+        indexes = [
+            models.Index(fields=['team', 'role'], name='teamrole_team_role_idx'),
+        ]
 
     def __str__(self):
         return f"{self.member.in_game_name} as {self.role} in {self.team.name}"
 
 
-@receiver(pre_save, sender=TeamRole)
-def limit_team_members(sender, instance, **kwargs):
-    # Check if a TeamRole with the same team, member, and role already exists.
-    if TeamRole.objects.filter(team=instance.team, member=instance.member, role=instance.role).exists():
-        raise ValidationError(
-            "A member can only have one unique role in the same team.")
-
 @receiver(post_save, sender=TeamRole)
+@receiver(post_delete, sender=TeamRole)
 def update_team_status(sender, instance, **kwargs):
-    team = instance.team
-    # Count unique main roles in the team
-    main_roles_count = team.roles.filter(role__in=[role[0] for role in TeamRole.MAIN_ROLE_CHOICES]).values('role').distinct().count()
-    # Check if team has 5 unique main roles
-    if main_roles_count == len(TeamRole.MAIN_ROLE_CHOICES):
-        team.status = True
-    else:
-        team.status = False
-    team.member_count = team.roles.count()
-    team.save()
+    # Duplicate roles are rejected by the (team, member, role) unique constraint, so there is no pre-check here
+    refreshed = Team.objects.filter(pk=instance.team_id).refresh_rosters()
+    # Keep an already loaded team in step, so callers serializing it see the new roster
+    if instance.team_id in refreshed and TeamRole.team.is_cached(instance):
+        for field, value in refreshed[instance.team_id].items():
+            setattr(instance.team, field, value)
+
+
+@receiver(post_save, sender=CustomUser)
+def update_rosters_on_rename(sender, instance, created, **kwargs):
+    if not created and instance._loaded_in_game_name not in (None, instance.in_game_name):
+        Team.objects.filter(pk__in=TeamRole.objects.filter(member=instance).values('team_id')).refresh_rosters()
+    instance._loaded_in_game_name = instance.in_game_name
 
 
 class Invitation(models.Model):
@@ -89,27 +229,75 @@ class Invitation(models.Model):
         max_length=20, choices=STATUS_CHOICES, default='Pending')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Status as loaded from the database, so receivers can tell when an invitation leaves 'Pending'
+    _loaded_status = None
+
     class Meta:
         unique_together = ('sender', 'receiver', 'team', 'role')
+        # The duplicate checks run on every invitation sent
+        indexes = [
+            models.Index(fields=['receiver', 'team', 'status'], name='invitation_receiver_idx'),
+            models.Index(fields=['team', 'role', 'status'], name='invitation_team_role_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'status' in field_names:
+            instance._loaded_status = values[field_names.index('status')]
+        return instance
 
     def __str__(self):
         return f"Invitation from {self.sender.full_name} to {self.receiver.full_name} for role {self.role} in team {self.team.name}"
 
 
+class NotificationQuerySet(models.QuerySet):
+    # A user's feed - personal notifications plus the broadcasts sent since they joined
+    def feed_for(self, user):
+        return self.filter(models.Q(user=user) | models.Q(user__isnull=True, created_at__gte=user.date_joined))
+
+
 class Notification(models.Model):
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    # Broadcasts are stored once with no user and merged into every feed at read time
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True, blank=True)
     message = models.CharField(max_length=255)
     created_at = models.DateTimeField(default=timezone.now)
+    # Read state of personal notifications; broadcasts are read through the user's NotificationCursor
+    is_read = models.BooleanField(default=False)
+
+    objects = NotificationQuerySet.as_manager()
+
+    class Meta:
+        # Serves both halves of the feed: a user's own rows and the broadcasts (user IS NULL) since they joined
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='notification_feed_idx'),
+        ]
+
+    @property
+    def is_broadcast(self):
+        return self.user_id is None
 
     def __str__(self):
         return self.message
 
+
+# Per-user read cursor - everything in the feed up to last_seen_id has been seen
+class NotificationCursor(models.Model):
+    user = models.OneToOneField(CustomUser, related_name='notification_cursor', on_delete=models.CASCADE, primary_key=True)
+    last_seen_id = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user} has seen notifications up to {self.last_seen_id}"
+
 # Tournamens
 class Tournament(models.Model):
     title = models.CharField(max_length=255)
     created_time = models.DateTimeField(auto_now_add=True)
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
+    # Bumped whenever ranks change, so cached leaderboards are keyed on it instead of being invalidated
+    standings_version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.title
@@ -122,23 +310,161 @@ class TournamentRegistration(models.Model):
 
 
 # Games schedule
-class GameSchedule(models.Model):
+class GameSchedule(BlobFieldsMixin, models.Model):
     tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='schedules')
     time = models.DateTimeField()
+    round = models.PositiveIntegerField(default=1)
     team_1 = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='game_schedules_team_1')
     team_2 = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='game_schedules_team_2')
     score_team_1 = models.IntegerField(default=0)
     score_team_2 = models.IntegerField(default=0)
     image_team_1 = models.ImageField(upload_to='team_photos/', blank=True, null=True)
     image_team_2 = models.ImageField(upload_to='team_photos/', blank=True, null=True)
+    # Vote tallies, only ever changed by atomic increments alongside a new Vote row
     vote = models.IntegerField(default=0)
-    vote_updated_by = models.ManyToManyField(CustomUser, related_name='voted_games', blank=True)
+    votes_team_1 = models.IntegerField(default=0)
+    votes_team_2 = models.IntegerField(default=0)
+    # Set once the result has been counted into the standings
+    winner_updated = models.BooleanField(default=False)
+
+    BLOB_FIELDS = ('image_team_1', 'image_team_2')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tournament', 'time'], name='gameschedule_fixtures_idx'),
+        ]
 
     def __str__(self):
         return f"{self.team_1}'s and {self.team_2}'s game has {self.vote} votes"
 
+    # Counts the final score into both teams' standings. The winner_updated flag is claimed with a
+    # conditional UPDATE in the same transaction, so a result is never counted twice.
+    # Returns False if it was already finalized.
+    def finalize_result(self):
+        with transaction.atomic():
+            if not GameSchedule.objects.filter(pk=self.pk, winner_updated=False).update(winner_updated=True):
+                return False
+            score_team_1, score_team_2 = GameSchedule.objects.filter(pk=self.pk).values_list('score_team_1', 'score_team_2').get()
+            Game.objects.bulk_create([
+                Game(tournament_id=self.tournament_id, team_id=team_id) for team_id in (self.team_1_id, self.team_2_id)
+            ], ignore_conflicts=True)
+            for team_id, scored, conceded in ((self.team_1_id, score_team_1, score_team_2), (self.team_2_id, score_team_2, score_team_1)):
+                Game.objects.filter(tournament_id=self.tournament_id, team_id=team_id).update(
+                    score=F('score') + scored,
+                    win=F('win') + int(scored > conceded),
+                    lost=F('lost') + int(scored < conceded),
+                    total_game=F('total_game') + 1,
+                )
+            # The counts changed even when no rank moved, and cached leaderboards are keyed by standings_version
+            if not Game.objects.filter(tournament_id=self.tournament_id).rerank():
+                Tournament.objects.filter(pk=self.tournament_id).update(standings_version=F('standings_version') + 1)
+                CollectionVersion.objects.bump(CollectionVersion.TOURNAMENTS)
+            CollectionVersion.objects.bump(CollectionVersion.GAME_SCHEDULE)
+        self.winner_updated = True
+        self.score_team_1, self.score_team_2 = score_team_1, score_team_2
+        return True
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_save, sender=GameSchedule)
+def update_blob_refs(sender, instance, created, update_fields=None, **kwargs):
+    loaded = {} if created else instance._loaded_blobs or {}
+    current = {field: getattr(instance, field).name or '' for field in instance.BLOB_FIELDS}
+    changed = [field for field in current if (created or field in loaded) and current[field] != loaded.get(field, '')
+               and (update_fields is None or field in update_fields)]
+    if changed:
+        with transaction.atomic():
+            Blob.objects.acquire(current[field] for field in changed)
+            Blob.objects.release(loaded.get(field, '') for field in changed)
+        # Thumbnails and WebP renditions of the new images are rendered off the request once committed
+        names = [current[field] for field in changed]
+        transaction.on_commit(lambda: derivatives.schedule(names))
+    instance._loaded_blobs = current
+
+
+@receiver(post_delete, sender=Team)
+@receiver(post_delete, sender=GameSchedule)
+def release_blobs(sender, instance, **kwargs):
+    loaded = instance._loaded_blobs or {}
+    Blob.objects.release(loaded.get(field, getattr(instance, field).name or '') for field in instance.BLOB_FIELDS)
+
+
+class VoteQuerySet(models.QuerySet):
+    # Records a vote and bumps the match tallies in one transaction. The (game, user) unique constraint
+    # is the duplicate check, so the cost does not depend on how many people already voted.
+    # Returns False when the user has already voted for this game.
+    def cast(self, game_id, user_id, team):
+        tally = Vote.TALLY_FIELDS[team]
+        try:
+            with transaction.atomic():
+                self.create(game_id=game_id, user_id=user_id, team=team)
+                GameSchedule.objects.filter(pk=game_id).update(vote=F('vote') + 1, **{tally: F(tally) + 1})
+        except IntegrityError:
+            return False
+        return True
+
 
-# Games history
+# Vote ledger - one row per user per game
+class Vote(models.Model):
+    TEAM_CHOICES = (
+        (1, 'Team 1'),
+        (2, 'Team 2'),
+    )
+    TALLY_FIELDS = {1: 'votes_team_1', 2: 'votes_team_2'}
+
+    game = models.ForeignKey(GameSchedule, related_name='votes', on_delete=models.CASCADE)
+    user = models.ForeignKey(CustomUser, related_name='votes', on_delete=models.CASCADE)
+    # Empty for votes recorded before teams were tracked
+    team = models.PositiveSmallIntegerField(choices=TEAM_CHOICES, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = VoteQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('game', 'user')
+
+    def __str__(self):
+        return f"{self.user} voted for team {self.team} in {self.game_id}"
+
+
+class GameQuerySet(models.QuerySet):
+    # Rewrites the precomputed rank of every row, per tournament, from the standings order. Ranks are unique
+    # (registration order is the last tie-breaker), so a team's neighbours are a rank range away. Only moved rows are
+    # written, and the tournament's standings_version is bumped when anything moved.
+    def rerank(self):
+        changed = []
+        tournament_id = position = None
+        for game in self.order_by('tournament_id', *Game.STANDINGS_ORDER).only('id', 'tournament_id', 'rank'):
+            if game.tournament_id != tournament_id:
+                tournament_id, position = game.tournament_id, 0
+            position += 1
+            if game.rank != position:
+                game.rank = position
+                changed.append(game)
+        if changed:
+            Game.objects.bulk_update(changed, ['rank'], batch_size=500)
+            Tournament.objects.filter(pk__in={game.tournament_id for game in changed}).update(
+                standings_version=F('standings_version') + 1)
+            CollectionVersion.objects.bump(CollectionVersion.TOURNAMENTS)
+        return len(changed)
+
+    # Ranks a newly registered team without reranking the tournament. With no results it follows every row with a
+    # better record and the earlier registrations on the same blank record; only rows with losses and nothing else
+    # (if any) move down one place. While registration is open that makes it the last rank.
+    def enter(self, tournament_id, team_id):
+        Game.objects.bulk_create([Game(tournament_id=tournament_id, team_id=team_id)], ignore_conflicts=True)
+        game = Game.objects.only('id', 'rank').get(tournament_id=tournament_id, team_id=team_id)
+        if game.rank is not None:
+            return
+        entries = Game.objects.filter(tournament_id=tournament_id, rank__isnull=False)
+        rank = entries.filter(models.Q(win__gt=0) | models.Q(score__gt=0) | models.Q(lost=0, id__lt=game.id)).count() + 1
+        entries.filter(rank__gte=rank).update(rank=F('rank') + 1)
+        Game.objects.filter(pk=game.pk).update(rank=rank)
+        Tournament.objects.filter(pk=tournament_id).update(standings_version=F('standings_version') + 1)
+        CollectionVersion.objects.bump(CollectionVersion.TOURNAMENTS)
+
+
+# Games history - the standings table, one row per team per tournament, updated only by GameSchedule.finalize_result
 class Game(models.Model):
     tournament = models.ForeignKey(
         Tournament, on_delete=models.CASCADE, related_name='games')
@@ -150,6 +476,26 @@ class Game(models.Model):
     # draw = models.IntegerField(default=0)
     total_game = models.IntegerField(default=0)
     registered_time = models.DateTimeField(auto_now_add=True)
+    rank = models.PositiveIntegerField(null=True, blank=True)
+
+    objects = GameQuerySet.as_manager()
+
+    # Standings order: match wins, then games won, then fewest losses, then the earlier registration
+    STANDINGS_ORDER = ('-win', '-score', 'lost', 'id')
+
+    class Meta:
+        unique_together = ('tournament', 'team')
+        indexes = [
+            models.Index(fields=['tournament', '-win', '-score', 'lost', 'id'], name='game_standings_idx'),
+            models.Index(fields=['tournament', 'rank'], name='game_rank_idx'),
+        ]
 
     def __str__(self):
         return f"{self.team} in {self.tournament} collected {self.score} score in {self.total_game} games"
+
+
+@receiver(post_save, sender=TournamentRegistration)
+def create_standing(sender, instance, created, **kwargs):
+    # Registered teams show up in the standings before their first result
+    if created:
+        Game.objects.enter(instance.tournament_id, instance.team_id)
@@ -0,0 +1,16 @@
+from rest_framework.pagination import CursorPagination
+
+
+# Default pagination for every list endpoint - opaque cursors keyed on a unique, insert-stable column,
+# so deep pages cost the same as the first one and stay valid while rows are added
+class DefaultCursorPagination(CursorPagination):
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        # Each viewset declares its own stable ordering, falling back to the primary key
+        ordering = getattr(view, 'ordering', None) or self.ordering
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
@@ -0,0 +1,93 @@
+import contextvars
+import hashlib
+import random
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+
+# Primary/replica routing. Reads go to one of settings.DATABASE_REPLICAS only inside a request that
+# ReplicaRoutingMiddleware opened for replica reads: a safe method from a client that has not written in the
+# last REPLICA_STICKY_SECONDS. Writes, every read after a write in the same request, management commands and
+# background threads stay on the primary. The sticky keys live in the REPLICA_STICKY_CACHE, which every worker
+# has to share: a write on one worker must keep the client on the primary on all of them.
+STICKY_KEY = 'replica:sticky:{}'
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def primary():
+    # For reads that seed long-lived state, such as the badge counters adjusted in place afterwards
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICAS and _replica_reads.get():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Whatever the request reads after a write has to see it
+        _replica_reads.set(False)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas are copies of the primary and get its schema with the data
+        return db not in settings.DATABASE_REPLICAS
+
+
+def _sticky_key(client):
+    return STICKY_KEY.format(hashlib.sha256(client.encode()).hexdigest())
+
+
+def _client_key(request):
+    # The credentials identify the client; the address is only used for requests without any, since behind a
+    # proxy or NAT it is shared. Credentials issued by a request are pinned by its view, see stick().
+    client = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    return _sticky_key(client or request.META.get('REMOTE_ADDR', ''))
+
+
+async def stick(credentials):
+    # For registration and login: the client's next request carries a token the replicas may not have yet
+    if settings.DATABASE_REPLICAS:
+        await caches[settings.REPLICA_STICKY_CACHE].aset(_sticky_key(credentials), True, settings.REPLICA_STICKY_SECONDS)
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        if settings.DATABASE_REPLICAS and settings.CACHES[settings.REPLICA_STICKY_CACHE]['BACKEND'].endswith('.LocMemCache'):
+            raise ImproperlyConfigured(
+                "Read replicas need a REPLICA_STICKY_CACHE shared by every worker, such as Redis or Memcached; "
+                "with LocMemCache a client that wrote can be sent to a lagging replica by another worker."
+            )
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        cache = caches[settings.REPLICA_STICKY_CACHE]
+        key = _client_key(request)
+        replica_reads = request.method in SAFE_METHODS and not cache.get(key)
+        token = _replica_reads.set(replica_reads)
+        try:
+            response = self.get_response(request)
+            # A write sends the request back to the primary; keep the client there until the replicas caught up
+            wrote = request.method not in SAFE_METHODS or (replica_reads and not _replica_reads.get())
+        finally:
+            _replica_reads.reset(token)
+        if wrote:
+            cache.set(key, True, settings.REPLICA_STICKY_SECONDS)
+        return response
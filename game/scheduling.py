@@ -0,0 +1,102 @@
+from collections import defaultdict
+
+
+# Fixture generators. Each takes team ids in seed order and yields (round, team_1, team_2) tuples,
+# so callers can stream fixtures into batched inserts without holding the whole schedule in memory.
+# A team without an opponent in a round has a bye; no fixture is produced for it.
+
+def round_robin(team_ids):
+    # Circle method: the first team stays fixed and the rest rotate one place per round.
+    # An odd field gets a phantom team, and whoever meets it sits the round out.
+    teams = list(team_ids)
+    if len(teams) % 2:
+        teams.append(None)
+    count = len(teams)
+    for round_number in range(1, count):
+        for i in range(count // 2):
+            home, away = teams[i], teams[count - 1 - i]
+            if home is None or away is None:
+                continue
+            # Alternate sides so nobody plays every game as team 1
+            if (round_number + i) % 2:
+                home, away = away, home
+            yield round_number, home, away
+        teams.insert(1, teams.pop())
+
+
+def round_robin_size(team_count):
+    return team_count * (team_count - 1) // 2
+
+
+def single_elimination(team_ids, history=()):
+    # Next round of a knockout bracket padded to the next power of two. Seed 1 meets the lowest seed
+    # and so on, so the missing opponents - the byes - go to the top seeds. Each later round folds the
+    # survivors the same way (first against last), which keeps the top seeds apart until the final.
+    # history holds (round, team_1, team_2, score_team_1, score_team_2) rows of the finished rounds;
+    # nothing is yielded once the bracket has a champion.
+    teams = list(team_ids)
+    size = 1
+    while size < len(teams):
+        size *= 2
+    winners = defaultdict(dict)
+    for round_number, team_1, team_2, score_team_1, score_team_2 in history:
+        winner = team_1 if score_team_1 > score_team_2 else team_2 if score_team_2 > score_team_1 else None
+        winners[round_number][frozenset((team_1, team_2))] = winner
+
+    entrants = teams + [None] * (size - len(teams))
+    round_number = 1
+    while len(entrants) > 1:
+        pairs = [(entrants[i], entrants[len(entrants) - 1 - i]) for i in range(len(entrants) // 2)]
+        if round_number not in winners:
+            for home, away in pairs:
+                if home is not None and away is not None:
+                    yield round_number, home, away
+            return
+        survivors = []
+        for home, away in pairs:
+            if home is None or away is None:
+                survivors.append(away if home is None else home)
+                continue
+            winner = winners[round_number].get(frozenset((home, away)))
+            if winner is None:
+                raise ValueError(f"Round {round_number} has no winner for {home} v {away}.")
+            survivors.append(winner)
+        entrants = survivors
+        round_number += 1
+
+
+def swiss_round(team_ids, points, played, had_bye, round_number):
+    # Next Swiss round: teams sorted by points (seed order breaks ties) and paired with the closest
+    # team they have not met. With an odd field the lowest-ranked team without a bye sits out.
+    ranked = sorted(team_ids, key=lambda team_id: -points.get(team_id, 0))
+    if len(ranked) % 2:
+        bye = next((team_id for team_id in reversed(ranked) if team_id not in had_bye), ranked[-1])
+        ranked.remove(bye)
+
+    unpaired = ranked
+    while unpaired:
+        team, rest = unpaired[0], unpaired[1:]
+        opponent = next((other for other in rest if other not in played.get(team, ())), rest[0])
+        rest.remove(opponent)
+        unpaired = rest
+        yield round_number, team, opponent
+
+
+def swiss_history(team_ids, fixtures):
+    # Points (one per match won), past pairings and past byes from
+    # (round, team_1, team_2, score_team_1, score_team_2) rows of earlier rounds
+    points = defaultdict(int)
+    played = defaultdict(set)
+    rounds = defaultdict(set)
+    for round_number, team_1, team_2, score_team_1, score_team_2 in fixtures:
+        played[team_1].add(team_2)
+        played[team_2].add(team_1)
+        rounds[round_number].update((team_1, team_2))
+        if score_team_1 > score_team_2:
+            points[team_1] += 1
+        elif score_team_2 > score_team_1:
+            points[team_2] += 1
+    had_bye = set()
+    for teams in rounds.values():
+        had_bye.update(set(team_ids) - teams)
+    return points, played, had_bye, max(rounds, default=0)
@@ -1,9 +1,24 @@
+from django.conf import settings
 from django.utils import timezone
 from rest_framework import serializers
-from .models import CustomUser, Team, TeamRole, Invitation, Notification, update_team_status, Tournament, TournamentRegistration, Game, GameSchedule
+from .models import CollectionVersion, CustomUser, Team, TeamRole, Invitation, Notification, Tournament, TournamentRegistration, Game, GameSchedule, Vote
 from django.contrib.auth.hashers import make_password
 from django.db import transaction
 from rest_framework.exceptions import PermissionDenied, ValidationError
+from .buffers import version_buffer, vote_buffer
+from .derivatives import derivative_url
+
+# Rendition of an image field (see game.derivatives), or the original until it has been rendered
+class DerivativeImageField(serializers.ReadOnlyField):
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        url = derivative_url(value, self.variant)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if url and request else url
+
 
 # Registration
 # User registration by email, first_name, last_name, in_game_name and password
@@ -16,7 +31,9 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         fields = ['username', 'full_name', 'password', 'in_game_name']
 
     def create(self, validated_data):
-        validated_data['password'] = make_password(validated_data['password'])
+        # The registration view hashes in the hashing pool and passes the result as password_hash
+        password = validated_data.pop('password')
+        validated_data['password'] = validated_data.pop('password_hash', None) or make_password(password)
 
         user = CustomUser.objects.create(**validated_data)
         return user
@@ -40,15 +57,17 @@ class CustomUserSerializer(serializers.ModelSerializer):
 class TeamSerializer(serializers.ModelSerializer):
     members = serializers.SerializerMethodField()
     creator_role = serializers.ChoiceField(choices=TeamRole.MAIN_ROLE_CHOICES, write_only=True)
+    logo_thumbnail = DerivativeImageField('thumbnail', source='logo')
+    logo_webp = DerivativeImageField('webp', source='logo')
 
     class Meta:
         model = Team
-        fields = ['id', 'creator', 'name', 'logo', 'created_at', 'status', 'member_count', 'members', 'creator_role']
+        fields = ['id', 'creator', 'name', 'logo', 'logo_thumbnail', 'logo_webp', 'created_at', 'status', 'member_count', 'members', 'creator_role']
         read_only_fields = ['id', 'created_at', 'status', 'creator', 'member_count', 'members']
 
     def get_members(self, obj):
-        roles = TeamRole.objects.filter(team=obj).select_related('member')
-        return [{'member_id': role.member.id, 'in_game_name': role.member.in_game_name, 'role': role.role} for role in roles]
+        # Reads the roster snapshot kept on the team by the TeamRole signals
+        return obj.roster
     
 
 class InvitationSerializer(serializers.ModelSerializer):
@@ -125,17 +144,14 @@ class InvitationSerializer(serializers.ModelSerializer):
                 message=f"{user.full_name} has {'accepted' if instance.status == 'Accepted' else 'declined'} your invitation to join the team {instance.team.name}."
             )
 
-            # If the invitation is accepted, add the user to the team roles
+            # If the invitation is accepted, add the user to the team roles; the TeamRole signal refreshes the team
             if instance.status == 'Accepted':
-                team_role, created = TeamRole.objects.get_or_create(
+                TeamRole.objects.get_or_create(
                     team=instance.team,
                     member=user,
                     defaults={'role': instance.role}
                 )
 
-                # Update team status if necessary, similar logic as in the signal
-                update_team_status(sender=TeamRole, instance=team_role, created=created, team=instance.team)
-
             return instance
 
 
@@ -143,26 +159,19 @@ class InvitationSerializer(serializers.ModelSerializer):
 class TeamsListSerializer(serializers.ModelSerializer):
     members = serializers.SerializerMethodField()
     creator_role = serializers.SerializerMethodField()
+    logo_thumbnail = DerivativeImageField('thumbnail', source='logo')
+    logo_webp = DerivativeImageField('webp', source='logo')
 
     class Meta:
         model = Team
-        fields = ['id', 'creator', 'name', 'logo', 'created_at', 'status', 'member_count', 'members', 'creator_role']
+        fields = ['id', 'creator', 'name', 'logo', 'logo_thumbnail', 'logo_webp', 'created_at', 'status', 'member_count', 'members', 'creator_role']
 
     def get_members(self, obj):
-        # Retrieve all TeamRole instances related to the team
-        team_roles = TeamRole.objects.filter(team=obj)
-        # Serialize each TeamRole into a simple dictionary
-        members_list = [{
-            'member_id': team_role.member.id,
-            'in_game_name': team_role.member.in_game_name,
-            'role': team_role.role
-        } for team_role in team_roles]
-        return members_list
+        # Reads the roster snapshot kept on the team by the TeamRole signals
+        return obj.roster
 
     def get_creator_role(self, obj):
-        # Example logic to determine the creator's role
-        creator_role = TeamRole.objects.filter(team=obj, member=obj.creator).first()
-        return creator_role.role if creator_role else None
+        return obj.roster_creator_role
 
 
 # Users list
@@ -174,23 +183,24 @@ class UsersListSerializer(serializers.ModelSerializer):
         fields = ["id", "username", "full_name", "in_game_name", "teams_roles"]
 
     def get_teams_roles(self, obj):
-        # Fetch all TeamRole instances related to the user
-        team_roles = TeamRole.objects.filter(member=obj)
-        # Serialize the TeamRole information into a list of dictionaries
+        # Serialize the TeamRole instances prefetched by UsersListViewSet
         return [{
             'team_id': team_role.team.id,
             'team_name': team_role.team.name,
             'role': team_role.role
-        } for team_role in team_roles]
+        } for team_role in obj.team_roles.all()]
 
 
 
 # Notifications
 class NotificationSerializer(serializers.ModelSerializer):
+    broadcast = serializers.BooleanField(source='is_broadcast', read_only=True)
+    seen = serializers.SerializerMethodField()
+
     class Meta:
         model = Notification
-        fields = ['id', 'user', 'message', 'created_at']
-        read_only_fields = ['id', 'created_at']
+        fields = ['id', 'user', 'message', 'created_at', 'broadcast', 'seen']
+        read_only_fields = ['id', 'created_at', 'broadcast', 'seen']
     
     def __init__(self, *args, **kwargs):
         super(NotificationSerializer, self).__init__(*args, **kwargs)
@@ -198,13 +208,29 @@ class NotificationSerializer(serializers.ModelSerializer):
         if not request or not request.user.is_staff:
             self.fields['message'].read_only = True
 
+    def get_seen(self, obj):
+        # The viewset passes the reader's cursor in the context, so this never queries
+        if obj.is_broadcast:
+            return obj.id <= self.context.get('last_seen_id', 0)
+        return obj.is_read
+
+
+# Admin broadcast to every user
+class NotificationBroadcastSerializer(serializers.Serializer):
+    message = serializers.CharField(max_length=255)
+
+
+# Moves the reader's cursor forward
+class NotificationSeenSerializer(serializers.Serializer):
+    last_seen_id = serializers.IntegerField(min_value=0, required=False)
+
 
 # Tournaments
 class TournamentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tournament
         fields = "__all__"
-        read_only_fields = ['teams']
+        read_only_fields = ['teams', 'standings_version']
 
     def validate(self, data):
         if self.context['request'].user.is_admin:
@@ -239,19 +265,31 @@ class TournamentRegistrationSerializer(serializers.ModelSerializer):
 
 # Game Schedule
 class GameScheduleSerializer(serializers.ModelSerializer):
+    # Clients vote by sending the team they back; the totals are read from vote_count and the per-team tallies
+    vote = serializers.ChoiceField(choices=Vote.TEAM_CHOICES, write_only=True, required=False)
+    vote_count = serializers.IntegerField(source='vote', read_only=True)
+    image_team_1_thumbnail = DerivativeImageField('thumbnail', source='image_team_1')
+    image_team_1_webp = DerivativeImageField('webp', source='image_team_1')
+    image_team_2_thumbnail = DerivativeImageField('thumbnail', source='image_team_2')
+    image_team_2_webp = DerivativeImageField('webp', source='image_team_2')
+
     class Meta:
         model = GameSchedule
         fields = "__all__"
-        read_only_fields = ['tournament', 'time', 'team_1', 'team_2', 'score_team_1', 'score_team_2', 'vote_updated_by']
+        read_only_fields = ['tournament', 'time', 'team_1', 'team_2', 'score_team_1', 'score_team_2', 'votes_team_1', 'votes_team_2', 'winner_updated']
 
     def update_vote(self, instance, validated_data):
         user = self.context['request'].user
         if 'vote' in validated_data:
-            if user in instance.vote_updated_by.all():
+            # In write-behind mode the vote is acknowledged once buffered and counted on the next flush
+            if settings.VOTE_WRITE_BEHIND:
+                if not vote_buffer.add(instance.pk, user.pk, validated_data['vote']):
+                    raise serializers.ValidationError("You have already voted for this game.")
+                return instance
+            if not Vote.objects.cast(instance.pk, user.pk, validated_data['vote']):
                 raise serializers.ValidationError("You have already voted for this game.")
-            instance.vote_updated_by.add(user)
-            instance.vote = validated_data['vote']  # Update the vote field directly
-            instance.save()
+            version_buffer.add(CollectionVersion.VOTES)
+            instance.refresh_from_db(fields=['vote', 'votes_team_1', 'votes_team_2'])
         return instance
 
     def update_image(self, instance, validated_data):
@@ -284,28 +322,15 @@ class GameScheduleSerializer(serializers.ModelSerializer):
 
 # Game History
 class GameSerializer(serializers.ModelSerializer):
+    team_name = serializers.CharField(source='team.name', read_only=True)
+
     class Meta:
         model = Game
         fields = "__all__"
-        read_only_fields = ['tournament', 'team', 'score', 'win', 'lost', 'total_game', 'registered_time']
+        read_only_fields = ['tournament', 'team', 'score', 'win', 'lost', 'total_game', 'registered_time', 'rank']
 
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        current_time = timezone.now()
-        game_schedules = GameSchedule.objects.filter(
-            tournament=instance.tournament, team_1=instance.team).order_by('time')
-        for schedule in game_schedules:
-
-            game_time = schedule.time
-            time_difference = current_time - game_time
-            if time_difference.total_seconds() > 172800 and not schedule.winner_updated:
-                if schedule.score_team_1 > schedule.score_team_2:
-                    instance.win += 1
-                elif schedule.score_team_1 < schedule.score_team_2:
-                    game_2 = Game.objects.get(team=schedule.team_2, tournament=schedule.tournament)
-                    game_2.win += 1
-                    game_2.save()
-                schedule.winner_updated = True
-                schedule.save()
-        instance.save()
-        return representation
+
+class LeaderboardQuerySerializer(serializers.Serializer):
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    team = serializers.IntegerField(required=False)
+    window = serializers.IntegerField(min_value=0, max_value=25, default=2)
@@ -0,0 +1,45 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+# The stock SQLite backend plus the two OPTIONS Django 5.1 adds to it, so settings carry over unchanged on upgrade:
+# - init_command: statements run on every new connection (the PRAGMA profile in settings.DATABASES)
+# - transaction_mode: how atomic() begins its transaction. IMMEDIATE takes the write lock up front, so a
+#   read-then-write transaction waits in busy_timeout instead of failing with "database is locked" when another
+#   writer committed between its read and its write.
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('init_command', None)
+        transaction_mode = kwargs.pop('transaction_mode', None)
+        if transaction_mode is not None and transaction_mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f"settings.DATABASES transaction_mode must be one of {', '.join(TRANSACTION_MODES)}.")
+        return kwargs
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        return mode.upper() if mode else None
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        init_command = self.settings_dict['OPTIONS'].get('init_command')
+        if init_command:
+            for statement in filter(None, (statement.strip() for statement in init_command.split(';'))):
+                conn.execute(statement)
+        return conn
+
+    def _set_autocommit(self, autocommit):
+        if autocommit or self.transaction_mode is None:
+            super()._set_autocommit(autocommit)
+        else:
+            with self.wrap_database_errors:
+                self.connection.isolation_level = self.transaction_mode
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
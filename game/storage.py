@@ -0,0 +1,45 @@
+import hashlib
+import os
+import tempfile
+from django.core.files.storage import FileSystemStorage
+
+BLOB_PREFIX = 'blobs'
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(f'{BLOB_PREFIX}/')
+
+
+# Content-addressed storage - an upload is hashed while it streams to a temporary file and then stored
+# under its SHA-256 digest, so identical team logos and match screenshots share one file. Uploading a blob
+# that already exists leaves the disk untouched. Blob rows count the model fields pointing at each file.
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save, never from a random suffix
+        return name
+
+    def _save(self, name, content):
+        directory = self.path(BLOB_PREFIX)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+
+            digest = digest.hexdigest()
+            name = f'{BLOB_PREFIX}/{digest[:2]}/{digest}{os.path.splitext(name)[1].lower()}'
+            path = self.path(name)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temp_path, self.file_permissions_mode)
+                # Atomic, so concurrent uploads of the same content both end up with one complete file
+                os.replace(temp_path, path)
+                temp_path = None
+            return name
+        finally:
+            if temp_path is not None:
+                os.unlink(temp_path)
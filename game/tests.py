@@ -1,3 +1,1067 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from unittest import mock
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from .buffers import LastLoginBuffer, VersionBumpBuffer, VoteBuffer
+from .caching import response_cache_stats
+from .hashing import HashingPool
+from .events import broker, notification_event
+from .routers import ReplicaRoutingMiddleware
+from .scheduling import round_robin, round_robin_size, single_elimination, swiss_history, swiss_round
+from .models import Blob, CollectionVersion, CustomUser, Team, TeamRole, Invitation, Notification, Tournament, TournamentRegistration, Game, GameSchedule, Vote
 
-# Create your tests here.
+
+MAIN_ROLES = [role[0] for role in TeamRole.MAIN_ROLE_CHOICES]
+
+
+def clear_caches():
+    # Versioned cache keys repeat across tests, since every test rolls the versions back
+    for cache in caches.all():
+        cache.clear()
+    response_cache_stats.clear()
+
+
+def create_users(count, offset=0, prefix='member'):
+    return CustomUser.objects.bulk_create([
+        CustomUser(username=f'{prefix}{offset + i}@example.com', in_game_name=f'{prefix}{offset + i}', full_name=f'{prefix.title()} {offset + i}')
+        for i in range(count)
+    ])
+
+
+def create_teams(creator, count, offset=0):
+    # Bulk role assignment skips the per-row signals, which keeps seeding large rosters fast
+    members = create_users(count, offset)
+    teams = Team.objects.bulk_create([
+        Team(creator=creator, name=f'Team {offset + i}')
+        for i in range(count)
+    ])
+    TeamRole.objects.assign(
+        [TeamRole(team=team, member=creator, role='Mid lane') for team in teams] +
+        [TeamRole(team=team, member=member, role='Top lane') for team, member in zip(teams, members)]
+    )
+    return teams
+
+
+def create_complete_team(creator, name, offset):
+    # A team holding all five main roles, which is what tournament registration requires
+    team = Team.objects.create(creator=creator, name=name)
+    members = [creator] + create_users(len(MAIN_ROLES) - 1, offset, prefix=f'{name.lower()}_')
+    TeamRole.objects.assign([TeamRole(team=team, member=member, role=role) for member, role in zip(members, MAIN_ROLES)])
+    team.refresh_from_db()
+    return team
+
+
+def create_schedules(tournament, team_1, team_2, count):
+    return GameSchedule.objects.bulk_create([
+        GameSchedule(tournament=tournament, team_1=team_1, team_2=team_2, time=tournament.start_time + timedelta(hours=i))
+        for i in range(count)
+    ])
+
+
+# Teams list
+class TeamRosterQueryCountTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.creator = CustomUser.objects.create(username='creator@example.com', in_game_name='creator', full_name='Creator')
+        self.client = APIClient()
+        self.client.force_authenticate(self.creator)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_teams_list_query_count_is_flat(self):
+        create_teams(self.creator, 10)
+        small, response = self.count_queries('/api/teams_list/')
+        create_teams(self.creator, 990, offset=10)
+        large, _ = self.count_queries('/api/teams_list/')
+        self.assertEqual(small, large)
+
+        team = response.json()['results'][0]
+        self.assertEqual(team['creator_role'], 'Mid lane')
+        self.assertEqual([member['role'] for member in team['members']], ['Mid lane', 'Top lane'])
+
+    def test_teams_query_count_is_flat(self):
+        create_teams(self.creator, 10)
+        small, response = self.count_queries('/api/teams/')
+        create_teams(self.creator, 990, offset=10)
+        large, _ = self.count_queries('/api/teams/')
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.json()['results'][0]['members']), 2)
+
+    def test_role_writes_bump_the_versions_once(self):
+        team = create_teams(self.creator, 1)[0]
+        member = create_users(1, prefix='jungler')[0]
+        versions = dict(CollectionVersion.objects.values_list('name', 'version'))
+        role = TeamRole.objects.create(team=team, member=member, role='Jungle')
+        role.delete()
+        bumped = dict(CollectionVersion.objects.values_list('name', 'version'))
+        self.assertEqual(bumped[CollectionVersion.TEAMS], versions[CollectionVersion.TEAMS] + 2)
+        self.assertEqual(bumped[CollectionVersion.USERS], versions[CollectionVersion.USERS] + 2)
+
+
+# Query budgets - every route carries an explicit ceiling on SQL statements,
+# and list endpoints must not issue more queries as their result size grows
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.admin = CustomUser.objects.create_user(username='admin@example.com', password='secret-pass', in_game_name='admin', full_name='Admin', is_staff=True)
+        cls.creator = CustomUser.objects.create_user(username='creator@example.com', password='secret-pass', in_game_name='creator', full_name='Creator')
+        cls.rival = CustomUser.objects.create_user(username='rival@example.com', password='secret-pass', in_game_name='rival', full_name='Rival')
+        cls.team = create_complete_team(cls.creator, 'Legends', 0)
+        cls.rival_team = create_complete_team(cls.rival, 'Rivals', 0)
+        cls.free_users = create_users(5, prefix='free')
+
+        cls.tournament = Tournament.objects.create(title='Open Cup', start_time=now - timedelta(days=1), end_time=now + timedelta(days=7))
+        TournamentRegistration.objects.create(tournament=cls.tournament, team=cls.rival_team)
+        cls.schedules = create_schedules(cls.tournament, cls.team, cls.rival_team, 5)
+
+        Invitation.objects.bulk_create([
+            Invitation(sender=cls.creator, receiver=user, team=cls.team, role='Sub player 1')
+            for user in cls.free_users
+        ])
+        Notification.objects.bulk_create([
+            Notification(user=cls.creator, message=f'Notification {i}') for i in range(5)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        clear_caches()
+
+    def login(self, user):
+        token, _ = Token.objects.get_or_create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        executed = len(context.captured_queries)
+        self.assertLessEqual(executed, budget, f'{executed} queries exceed the budget of {budget}:\n' + '\n'.join(
+            query['sql'] for query in context.captured_queries))
+
+    def assertFlatQueries(self, url, grow):
+        # Runs the list endpoint, grows its result set, and checks the query count did not move.
+        # Both runs miss the response cache, which bulk-created fixtures would not invalidate anyway.
+        clear_caches()
+        with CaptureQueriesContext(connection) as before:
+            first = self.client.get(url)
+        grow()
+        clear_caches()
+        with CaptureQueriesContext(connection) as after:
+            second = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertGreater(len(second.json()['results']), len(first.json()['results']))
+        self.assertEqual(len(before.captured_queries), len(after.captured_queries))
+
+    # Registration / login / logout
+    def test_registration_budget(self):
+        # Two of them open and release the transaction around the user and token rows
+        with self.assertQueryBudget(7):
+            response = self.client.post('/registration/', {
+                'username': 'newcomer@example.com', 'full_name': 'Newcomer', 'password': 'secret-pass', 'in_game_name': 'newcomer'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_registration_is_atomic_and_documented(self):
+        with mock.patch('game.views.Token.objects.create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post('/registration/', {
+                    'username': 'halfway@example.com', 'full_name': 'Halfway', 'password': 'secret-pass', 'in_game_name': 'halfway'}, format='json')
+        self.assertFalse(CustomUser.objects.filter(username='halfway@example.com').exists())
+
+        # DRF's parsers and exception handling apply, and the schema lists both endpoints
+        response = self.client.post('/login/', '{not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        # The viewsets that filter by request.user log their schema errors, which are not under test here
+        with mock.patch('drf_yasg.inspectors.base.logger'):
+            paths = self.client.get('/swagger.json/').json()['paths']
+        self.assertIn('/registration/', paths)
+        self.assertIn('/login/', paths)
+
+    def test_login_budget(self):
+        buffer = LastLoginBuffer(interval=3600)
+        with mock.patch('game.views.last_login_buffer', buffer), self.assertQueryBudget(5):
+            response = self.client.post('/login/', {'username': 'creator@example.com', 'password': 'secret-pass'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(buffer.flush(), 1)
+
+    def test_login_upgrades_hashes_and_reports_failures(self):
+        # A hash from a hasher that is no longer the preferred one is replaced on the next login
+        with self.settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher', 'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']):
+            CustomUser.objects.filter(pk=self.creator.pk).update(password=make_password('secret-pass', hasher='pbkdf2_sha1'))
+            buffer = LastLoginBuffer(interval=3600)
+            with mock.patch('game.views.last_login_buffer', buffer):
+                response = self.client.post('/login/', {'username': 'creator@example.com', 'password': 'secret-pass'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertTrue(CustomUser.objects.get(pk=self.creator.pk).password.startswith('md5$'))
+
+        failures = mock.Mock()
+        user_login_failed.connect(failures)
+        self.addCleanup(user_login_failed.disconnect, failures)
+        self.assertEqual(self.client.post('/login/', {'username': 'creator@example.com', 'password': 'wrong'}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/login/', {'username': 'nobody@example.com', 'password': 'wrong'}, format='json').status_code, 401)
+        self.assertEqual([call.kwargs['credentials'] for call in failures.call_args_list],
+                         [{'username': 'creator@example.com'}, {'username': 'nobody@example.com'}])
+
+    def test_logout_budget(self):
+        self.login(self.creator)
+        with self.assertQueryBudget(3):
+            response = self.client.post('/logout/')
+        self.assertEqual(response.status_code, 200)
+
+    # Personal page
+    def test_personal_page_budget(self):
+        self.login(self.creator)
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/personal_page/')
+        self.assertEqual(response.status_code, 200)
+        # One of them finds the user's tokens, whose cached copies the save invalidates
+        with self.assertQueryBudget(7):
+            response = self.client.patch(f'/api/personal_page/{self.creator.id}/', {'in_game_name': 'renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Team.objects.get(pk=self.team.pk).roster_creator_role, 'Top lane')
+        self.assertIn('renamed', [entry['in_game_name'] for entry in Team.objects.get(pk=self.team.pk).roster])
+
+    # Teams
+    def test_teams_budget(self):
+        self.login(self.creator)
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/teams/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFlatQueries('/api/teams/', lambda: create_teams(self.creator, 20))
+
+    def test_team_create_budget(self):
+        self.login(self.free_users[0])
+        with self.assertQueryBudget(11):
+            response = self.client.post('/api/teams/', {'name': 'Newcomers', 'creator_role': 'Jungle'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_team_update_budget(self):
+        self.login(self.creator)
+        # creator_role only applies on creation; updates accept and ignore it
+        with self.assertQueryBudget(6):
+            response = self.client.put(f'/api/teams/{self.team.pk}/', {'name': 'Renamed', 'creator_role': 'Jungle'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        with self.assertQueryBudget(6):
+            response = self.client.patch(f'/api/teams/{self.team.pk}/', {'name': 'Patched', 'creator_role': 'Jungle'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        team = Team.objects.get(pk=self.team.pk)
+        self.assertEqual((team.name, team.roster_creator_role), ('Patched', 'Top lane'))
+
+    def test_teams_list_budget(self):
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/teams_list/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFlatQueries('/api/teams_list/', lambda: create_teams(self.creator, 20))
+
+    def test_users_list_budget(self):
+        with self.assertQueryBudget(3):
+            response = self.client.get('/api/users_list/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFlatQueries('/api/users_list/', lambda: create_teams(self.creator, 20))
+
+    # Invitations
+    def test_invitations_budget(self):
+        self.login(self.creator)
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/invitation/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFlatQueries('/api/invitation/', lambda: Invitation.objects.bulk_create([
+            Invitation(sender=self.creator, receiver=user, team=self.team, role='Sub player 2')
+            for user in create_users(10, prefix='invited')
+        ]))
+
+    def test_invitation_create_budget(self):
+        self.login(self.creator)
+        receiver = create_users(1, prefix='candidate')[0]
+        with self.assertQueryBudget(13):
+            response = self.client.post('/api/invitation/', {'receiver': receiver.id, 'team': self.team.id, 'role': 'Sub player 2'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_invitation_decline_budget(self):
+        receiver = self.free_users[0]
+        invitation = Invitation.objects.get(receiver=receiver)
+        self.login(receiver)
+        with self.assertQueryBudget(13):
+            response = self.client.patch(f'/api/invitation/{invitation.id}/', {'status': 'Declined'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    # Notifications
+    def test_notifications_budget(self):
+        self.login(self.creator)
+        with self.assertQueryBudget(3):
+            response = self.client.get('/api/notification/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFlatQueries('/api/notification/', lambda: Notification.objects.bulk_create([
+            Notification(user=self.creator, message=f'Extra {i}') for i in range(20)
+        ]))
+
+    def test_notification_broadcast_budget(self):
+        self.login(self.admin)
+        with self.assertQueryBudget(2):
+            response = self.client.post('/api/notification/', {'message': 'Finals start at 20:00'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.json()['broadcast'])
+        self.assertEqual(Notification.objects.filter(message='Finals start at 20:00').count(), 1)
+
+        # The broadcast is merged into every feed at read time, and the read cursor marks it seen
+        self.login(self.creator)
+        latest = self.client.get('/api/notification/').json()['results'][0]
+        self.assertEqual((latest['message'], latest['seen']), ('Finals start at 20:00', False))
+        with self.assertQueryBudget(9):
+            response = self.client.post('/api/notification/seen/')
+        self.assertEqual(response.json()['last_seen_id'], latest['id'])
+        self.assertTrue(self.client.get('/api/notification/').json()['results'][0]['seen'])
+
+    def test_broadcasts_cannot_be_marked_read(self):
+        self.login(self.admin)
+        broadcast = Notification.objects.create(message='Maintenance tonight')
+        response = self.client.post(f'/api/notification/{broadcast.id}/read/')
+        self.assertEqual(response.status_code, 400)
+        broadcast.refresh_from_db()
+        self.assertFalse(broadcast.is_read)
+        self.assertIsNone(caches['default'].get('badge:notifications:None'))
+
+    def test_seen_cursor_stops_at_the_newest_notification(self):
+        self.login(self.creator)
+        latest = Notification.objects.feed_for(self.creator).latest('id').id
+        response = self.client.post('/api/notification/seen/', {'last_seen_id': latest + 1000}, format='json')
+        self.assertEqual(response.json()['last_seen_id'], latest)
+
+        # A broadcast sent afterwards has not been seen
+        self.login(self.admin)
+        self.client.post('/api/notification/', {'message': 'Later broadcast'}, format='json')
+        self.login(self.creator)
+        newest = self.client.get('/api/notification/').json()['results'][0]
+        self.assertEqual((newest['message'], newest['seen']), ('Later broadcast', False))
+
+    def test_unread_count_budget(self):
+        self.login(self.creator)
+        self.client.get('/api/notification/unread_count/')
+        with self.assertQueryBudget(6):
+            response = self.client.get('/api/notification/unread_count/')
+        self.assertEqual(response.json()['unread'], 5)
+
+        # New rows adjust the cached counters instead of forcing a recount
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(user=self.creator, message='Personal')
+            Notification.objects.create(message='Broadcast')
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/notification/unread_count/')
+        self.assertEqual(response.json(), {'unread': 7, 'personal': 6, 'broadcasts': 1})
+
+        notification = Notification.objects.filter(user=self.creator).latest('id')
+        self.client.post(f'/api/notification/{notification.id}/read/')
+        with self.assertQueryBudget(6):
+            response = self.client.get('/api/notification/unread_count/')
+        self.assertEqual(response.json()['personal'], 5)
+
+    def test_pending_count_budget(self):
+        receiver = self.free_users[0]
+        self.login(receiver)
+        self.client.get('/api/invitation/pending_count/')
+        with self.assertQueryBudget(6):
+            response = self.client.get('/api/invitation/pending_count/')
+        self.assertEqual(response.json()['pending'], 1)
+
+        invitation = Invitation.objects.get(receiver=receiver)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/invitation/{invitation.id}/', {'status': 'Declined'}, format='json')
+        with self.assertQueryBudget(6):
+            response = self.client.get('/api/invitation/pending_count/')
+        self.assertEqual(response.json()['pending'], 0)
+
+    # Tournaments
+    def test_tournaments_budget(self):
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/tournaments/')
+        self.assertEqual(response.status_code, 200)
+        now = timezone.now()
+        self.assertFlatQueries('/api/tournaments/', lambda: Tournament.objects.bulk_create([
+            Tournament(title=f'Cup {i}', start_time=now, end_time=now + timedelta(days=1)) for i in range(20)
+        ]))
+
+    def test_tournament_registrations_budget(self):
+        self.login(self.creator)
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/tournament-registrations/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFlatQueries('/api/tournament-registrations/', lambda: TournamentRegistration.objects.bulk_create([
+            TournamentRegistration(tournament=self.tournament, team=team) for team in create_teams(self.creator, 20)
+        ]))
+
+    def test_tournament_registration_create_budget(self):
+        self.login(self.creator)
+        # The new standings row is slotted in with a count and a shift, whatever the size of the field
+        with self.assertQueryBudget(15):
+            response = self.client.post('/api/tournament-registrations/', {'tournament': self.tournament.id, 'team': self.team.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_standings_budget(self):
+        with self.assertQueryBudget(6):
+            response = self.client.get(f'/api/tournaments/{self.tournament.id}/standings/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['team_name'] for row in response.json()], ['Rivals'])
+
+    def test_leaderboard_budget(self):
+        with self.assertQueryBudget(4):
+            response = self.client.get(f'/api/tournaments/{self.tournament.id}/leaderboard/?team={self.rival_team.id}')
+        self.assertEqual(response.json()['team']['rank'], 1)
+
+    # Game schedule
+    def test_game_schedule_budget(self):
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/game_schedule/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFlatQueries('/api/game_schedule/', lambda: create_schedules(self.tournament, self.team, self.rival_team, 20))
+
+    def test_game_schedule_vote_budget(self):
+        buffer = VersionBumpBuffer(interval=3600)
+        self.enterContext(mock.patch('game.serializers.version_buffer', buffer))
+        self.login(self.free_users[0])
+        # No version row is written per vote
+        with self.assertQueryBudget(7):
+            response = self.client.patch(f'/api/game_schedule/{self.schedules[0].id}/', {'vote': 1}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['vote_count'], response.json()['votes_team_1']), (1, 1))
+        self.login(self.free_users[1])
+        self.client.patch(f'/api/game_schedule/{self.schedules[0].id}/', {'vote': 1}, format='json')
+
+        # Cached schedule pages catch up with the tallies once the buffered bump is flushed
+        version = CollectionVersion.objects.get(name=CollectionVersion.VOTES).version
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(CollectionVersion.objects.get(name=CollectionVersion.VOTES).version, version + 1)
+        row = next(row for row in self.client.get('/api/game_schedule/').json()['results'] if row['id'] == self.schedules[0].id)
+        self.assertEqual(row['votes_team_1'], 2)
+
+        # The ledger's unique constraint rejects a second vote without loading the other voters
+        with self.assertQueryBudget(6):
+            response = self.client.patch(f'/api/game_schedule/{self.schedules[0].id}/', {'vote': 2}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(GameSchedule.objects.get(pk=self.schedules[0].pk).votes_team_2, 0)
+
+
+# Conditional GET
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.tournament = Tournament.objects.create(title='Spring Cup', start_time=now, end_time=now + timedelta(days=1))
+
+    def setUp(self):
+        clear_caches()
+
+    def test_unchanged_collection_returns_304_without_loading_rows(self):
+        first = self.client.get('/api/tournaments/')
+        self.assertEqual(first.status_code, 200)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/tournaments/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertNotEqual(self.client.get('/api/tournaments/?page_size=1')['ETag'], first['ETag'])
+
+        # Any write to the collection, including ones that bypass signals, changes the validator
+        self.tournament.title = 'Summer Cup'
+        self.tournament.save()
+        response = self.client.get('/api/tournaments/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['title'], 'Summer Cup')
+
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/tournaments/')['X-Cache'], 'HIT')
+        TournamentRegistration.objects.create(tournament=self.tournament, team=create_teams(
+            CustomUser.objects.create(username='owner@example.com', in_game_name='owner', full_name='Owner'), 1)[0])
+        response = self.client.get('/api/tournaments/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['X-Cache']), (200, 'MISS'))
+
+
+    def test_role_changes_invalidate_cached_users_list(self):
+        admin = CustomUser.objects.create(username='staff@example.com', in_game_name='staff', full_name='Staff', is_staff=True)
+        team = Team.objects.create(creator=admin, name='Staffers')
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get('/api/users_list/')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/api/users_list/')['X-Cache'], 'HIT')
+
+        TeamRole.objects.assign([TeamRole(team=team, member=admin, role=MAIN_ROLES[0])])
+        response = self.client.get('/api/users_list/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][-1]['teams_roles'][0]['team_name'], 'Staffers')
+        self.assertEqual(self.client.get('/api/cache_stats/').json(), {'users_list:miss': 2, 'users_list:hit': 1})
+
+
+# Standings
+class SchedulingTests(SimpleTestCase):
+    def test_round_robin_pairs_every_team_once(self):
+        for count in (2, 5, 8):
+            teams = list(range(1, count + 1))
+            fixtures = list(round_robin(teams))
+            pairs = [frozenset((team_1, team_2)) for _, team_1, team_2 in fixtures]
+            self.assertEqual(len(pairs), round_robin_size(count))
+            self.assertEqual(len(set(pairs)), len(pairs))
+
+            # Nobody plays twice in a round; an odd field leaves exactly one team out of each round, once each
+            playing = defaultdict(list)
+            for round_number, team_1, team_2 in fixtures:
+                playing[round_number] += [team_1, team_2]
+            byes = []
+            for teams_in_round in playing.values():
+                self.assertEqual(len(teams_in_round), len(set(teams_in_round)))
+                byes += set(teams) - set(teams_in_round)
+            self.assertEqual(sorted(byes), teams if count % 2 else [])
+
+    def test_single_elimination_advances_winners_to_the_final(self):
+        teams = [1, 2, 3, 4, 5, 6]
+        # Padded to eight, so the top two seeds have byes
+        self.assertEqual(list(single_elimination(teams)), [(1, 3, 6), (1, 4, 5)])
+        history = [(1, 3, 6, 2, 0), (1, 4, 5, 0, 2)]
+        self.assertEqual(list(single_elimination(teams, history)), [(2, 1, 5), (2, 2, 3)])
+        history += [(2, 1, 5, 1, 0), (2, 2, 3, 0, 1)]
+        self.assertEqual(list(single_elimination(teams, history)), [(3, 1, 3)])
+        self.assertEqual(list(single_elimination(teams, history + [(3, 1, 3, 0, 2)])), [])
+        with self.assertRaises(ValueError):
+            list(single_elimination(teams, history + [(3, 1, 3, 1, 1)]))
+
+    def test_swiss_pairs_by_points_without_rematches(self):
+        teams = [1, 2, 3, 4, 5]
+        first = list(swiss_round(teams, {}, {}, set(), 1))
+        self.assertEqual(first, [(1, 1, 2), (1, 3, 4)])
+        points, played, had_bye, last_round = swiss_history(teams, [(1, 1, 2, 2, 0), (1, 3, 4, 0, 2)])
+        self.assertEqual((had_bye, last_round), ({5}, 1))
+        second = list(swiss_round(teams, points, played, had_bye, last_round + 1))
+        # Team 5 already sat out, so the lowest-ranked team without a bye (3) gets it
+        self.assertEqual(second, [(2, 1, 4), (2, 2, 5)])
+
+
+class CreateGameScheduleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create(username='organiser@example.com', in_game_name='organiser', full_name='Organiser', is_staff=True)
+        cls.teams = create_teams(cls.admin, 6)
+        now = timezone.now()
+        cls.tournament, cls.other = Tournament.objects.bulk_create([
+            Tournament(title=title, start_time=now, end_time=now + timedelta(days=7)) for title in ('Cup', 'Other')
+        ])
+        TournamentRegistration.objects.bulk_create([
+            TournamentRegistration(tournament=tournament, team=team) for tournament in (cls.tournament, cls.other) for team in cls.teams
+        ])
+
+    def schedule(self, *args):
+        out = io.StringIO()
+        call_command('create_game_schedule', '--tournament', str(self.tournament.id), *args, stdout=out)
+        return out.getvalue()
+
+    def finish_round(self, round_number):
+        # The higher seed (lower team id) wins every game
+        for game in GameSchedule.objects.filter(tournament=self.tournament, round=round_number):
+            home_wins = game.team_1_id < game.team_2_id
+            GameSchedule.objects.filter(pk=game.pk).update(score_team_1=int(home_wins), score_team_2=int(not home_wins))
+            game.finalize_result()
+
+    def test_round_robin_only_schedules_the_selected_tournament(self):
+        self.assertIn('Would create 15 round-robin fixtures over 5 round(s)', self.schedule('--dry-run'))
+        self.assertFalse(GameSchedule.objects.exists())
+
+        self.assertIn('Created 15 round-robin fixtures', self.schedule())
+        self.assertEqual(GameSchedule.objects.filter(tournament=self.tournament).count(), 15)
+        self.assertFalse(GameSchedule.objects.filter(tournament=self.other).exists())
+        self.assertIn('Fixtures already exist', self.schedule())
+        self.assertEqual(GameSchedule.objects.count(), 15)
+
+    def test_single_elimination_progresses_from_finalized_results(self):
+        self.assertIn('Created 2 single-elimination fixtures over 1 round(s) for 6 teams with 2 bye(s)',
+                      self.schedule('--format', 'single-elimination'))
+        with self.assertRaises(CommandError):
+            self.schedule('--format', 'single-elimination')
+
+        self.finish_round(1)
+        self.schedule('--format', 'single-elimination')
+        self.finish_round(2)
+        self.schedule('--format', 'single-elimination')
+        final = GameSchedule.objects.get(tournament=self.tournament, round=3)
+        self.assertEqual({final.team_1_id, final.team_2_id}, {self.teams[0].id, self.teams[1].id})
+        self.finish_round(3)
+        self.assertIn('The bracket is complete', self.schedule('--format', 'single-elimination'))
+
+    def test_swiss_waits_for_the_previous_round(self):
+        self.assertIn('Created 3 swiss fixtures', self.schedule('--format', 'swiss'))
+        with self.assertRaises(CommandError):
+            self.schedule('--format', 'swiss')
+        self.finish_round(1)
+        self.schedule('--format', 'swiss')
+        self.assertEqual(GameSchedule.objects.filter(tournament=self.tournament, round=2).count(), 3)
+
+
+class AdviseIndexesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = CustomUser.objects.create(username='analyst@example.com', in_game_name='analyst', full_name='Analyst')
+        cls.team = create_teams(cls.creator, 1)[0]
+        cls.receiver = create_users(1, prefix='prospect')[0]
+        now = timezone.now()
+        tournament = Tournament.objects.create(title='Sample', start_time=now, end_time=now + timedelta(days=1))
+        TournamentRegistration.objects.create(tournament=tournament, team=cls.team)
+
+    def test_replays_endpoints_without_leaving_writes(self):
+        out = io.StringIO()
+        call_command('advise_indexes', '--user', self.creator.username, '--repeat', '2', stdout=out)
+        output = out.getvalue()
+        self.assertIn('GET /api/teams_list/ -> 200', output)
+        self.assertIn('/leaderboard/?team=', output)
+        # A free role, so the replayed invitation runs the whole write path
+        self.assertIn('POST /api/invitation/ -> 201', output)
+        self.assertRegex(output, r'\d+ flagged query plan\(s\)')
+        self.assertFalse(Invitation.objects.exists())
+
+
+class StandingsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create(username='referee@example.com', in_game_name='referee', full_name='Referee', is_staff=True)
+        cls.home, cls.away = create_teams(cls.admin, 2)
+        now = timezone.now()
+        cls.tournament = Tournament.objects.create(title='League', start_time=now, end_time=now + timedelta(days=7))
+        cls.schedules = create_schedules(cls.tournament, cls.home, cls.away, 3)
+        GameSchedule.objects.filter(pk=cls.schedules[0].pk).update(score_team_1=2, score_team_2=1)
+        GameSchedule.objects.filter(pk=cls.schedules[1].pk).update(score_team_1=0, score_team_2=2)
+        GameSchedule.objects.filter(pk=cls.schedules[2].pk).update(score_team_1=3, score_team_2=0)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        clear_caches()
+
+    def test_finalized_results_are_counted_once(self):
+        for schedule in self.schedules:
+            self.assertEqual(self.client.post(f'/api/game_schedule/{schedule.id}/finalize/').status_code, 200)
+        self.assertEqual(self.client.post(f'/api/game_schedule/{self.schedules[0].id}/finalize/').status_code, 400)
+
+        rows = self.client.get(f'/api/tournaments/{self.tournament.id}/standings/').json()
+        self.assertEqual([(row['team'], row['win'], row['lost'], row['score'], row['total_game']) for row in rows],
+                         [(self.home.id, 2, 1, 5, 3), (self.away.id, 1, 2, 3, 3)])
+
+        # Reading standings never writes
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(f'/api/tournaments/{self.tournament.id}/standings/')
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in context.captured_queries))
+
+    def test_leaderboard_is_ranked_and_cached_per_version(self):
+        url = f'/api/tournaments/{self.tournament.id}/leaderboard/?team={self.away.id}&window=1'
+        self.schedules[1].finalize_result()
+        board = self.client.get(url).json()
+        self.assertEqual([row['team'] for row in board['results']], [self.away.id, self.home.id])
+        self.assertEqual((board['team']['rank'], len(board['window'])), (1, 2))
+
+        # Between result changes only the tournament is read
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).json(), board)
+        self.assertEqual(len(context.captured_queries), 1)
+
+        # A result that moves no rank still reaches the cached leaderboard
+        self.schedules[0].finalize_result()
+        board = self.client.get(url).json()
+        self.assertEqual([(row['team'], row['win']) for row in board['results']], [(self.away.id, 1), (self.home.id, 1)])
+
+        self.schedules[2].finalize_result()
+        board = self.client.get(url).json()
+        self.assertEqual(board['team']['rank'], 2)
+        self.assertEqual([row['rank'] for row in board['window']], [1, 2])
+
+        self.assertEqual(self.client.get(f'/api/tournaments/{self.tournament.id}/leaderboard/?limit=0').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/tournaments/{self.tournament.id}/leaderboard/?team=0').status_code, 404)
+
+    def test_registration_slots_the_new_team_in_without_a_rerank(self):
+        self.schedules[1].finalize_result()
+        newcomer, late = create_teams(self.admin, 2, offset=10)
+        TournamentRegistration.objects.create(tournament=self.tournament, team=newcomer)
+        TournamentRegistration.objects.create(tournament=self.tournament, team=late)
+        # A blank record ranks ahead of a team that only lost, and behind earlier registrations
+        self.assertEqual(list(Game.objects.filter(tournament=self.tournament).order_by('rank').values_list('team_id', 'rank')),
+                         [(self.away.id, 1), (newcomer.id, 2), (late.id, 3), (self.home.id, 4)])
+        self.assertEqual(Game.objects.filter(tournament=self.tournament).rerank(), 0)
+
+    def test_finalize_is_staff_only(self):
+        self.client.force_authenticate(CustomUser.objects.create(username='fan@example.com', in_game_name='fan', full_name='Fan'))
+        self.assertEqual(self.client.post(f'/api/game_schedule/{self.schedules[0].id}/finalize/').status_code, 403)
+        self.assertFalse(Game.objects.exists())
+
+
+# Token authentication cache
+class CachedTokenAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='player@example.com', password='secret-pass', in_game_name='player', full_name='Player')
+
+    def setUp(self):
+        clear_caches()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeat_requests_skip_the_token_query(self):
+        self.assertEqual(self.client.get('/api/invitation/pending_count/').status_code, 200)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get('/api/invitation/pending_count/').status_code, 200)
+        self.assertFalse([query for query in context.captured_queries if 'authtoken_token' in query['sql']])
+
+    def test_logout_invalidates_the_cached_token(self):
+        self.assertEqual(self.client.get('/api/invitation/pending_count/').status_code, 200)
+        self.assertEqual(self.client.post('/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/invitation/pending_count/').status_code, 401)
+
+    def test_saving_the_user_invalidates_the_cached_copy(self):
+        team = create_complete_team(self.user, 'Cached', 0)
+        self.assertEqual(self.client.get('/api/invitation/pending_count/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/personal_page/{self.user.id}/', {'in_game_name': 'renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        # A password change right after the rename must not write the old name back
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/personal_page/{self.user.id}/', {'password': 'another-pass'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.in_game_name, 'renamed')
+        self.assertTrue(self.user.check_password('another-pass'))
+        team.refresh_from_db()
+        self.assertIn('renamed', json.dumps(team.roster))
+
+    def test_per_process_cache_is_refused_outside_debug(self):
+        from .authentication import require_shared_auth_cache
+
+        with override_settings(DEBUG=False):
+            with self.assertRaises(ImproperlyConfigured):
+                require_shared_auth_cache()
+            with override_settings(TOKEN_CACHE_SIZE=0):
+                require_shared_auth_cache()
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}):
+                require_shared_auth_cache()
+        with override_settings(DEBUG=True):
+            require_shared_auth_cache()
+
+    def test_deleted_token_is_invalidated(self):
+        self.assertEqual(self.client.get('/api/invitation/pending_count/').status_code, 200)
+        Token.objects.filter(pk=self.token.pk).get().delete()
+        self.assertEqual(self.client.get('/api/invitation/pending_count/').status_code, 401)
+
+
+# Password hashing pool
+class HashingPoolTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='rush@example.com', password='secret-pass', in_game_name='rush', full_name='Rush')
+
+    def test_saturated_pool_sheds_logins(self):
+        pool = HashingPool(workers=1, backlog=0)
+        release = threading.Event()
+        pool.executor.submit(release.wait)
+        pool.slots.acquire()
+        try:
+            with mock.patch('game.views.hashing_pool', pool):
+                response = self.client.post('/login/', {'username': 'rush@example.com', 'password': 'secret-pass'}, content_type='application/json')
+        finally:
+            release.set()
+            pool.slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+        buffer = LastLoginBuffer(interval=3600)
+        with mock.patch('game.views.hashing_pool', pool), mock.patch('game.views.last_login_buffer', buffer):
+            response = self.client.post('/login/', {'username': 'rush@example.com', 'password': 'secret-pass'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['token'], Token.objects.get(user=self.user).key)
+        self.assertEqual(buffer.flush(), 1)
+
+    def test_wrong_password_and_unknown_user(self):
+        response = self.client.post('/login/', {'username': 'rush@example.com', 'password': 'wrong'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/login/', {'username': 'nobody@example.com', 'password': 'wrong'}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+
+# Notification stream
+class NotificationStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='listener@example.com', in_game_name='listener', full_name='Listener')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.missed = Notification.objects.create(user=cls.user, message='Sent while offline')
+
+    async def read_event(self, stream):
+        while True:
+            chunk = await asyncio.wait_for(anext(stream), timeout=2)
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if chunk.startswith('id:'):
+                return json.loads(chunk.split('data: ', 1)[1])
+
+    async def test_stream_resumes_and_pushes_new_notifications(self):
+        response = await self.async_client.get(
+            '/api/notification/stream/', headers={'Authorization': f'Token {self.token.key}', 'Last-Event-ID': '0'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+
+        # Resuming from id 0 replays what was missed, then live events are pushed as they are published
+        self.assertEqual((await self.read_event(stream))['message'], 'Sent while offline')
+        broadcast = await Notification.objects.acreate(message='Finals are live')
+        broker.publish(None, notification_event(broadcast))
+        self.assertEqual((await self.read_event(stream))['id'], broadcast.id)
+        await stream.aclose()
+
+    async def test_stream_requires_token(self):
+        response = await self.async_client.get('/api/notification/stream/')
+        self.assertEqual(response.status_code, 401)
+
+
+# Write-behind voting
+class VoteBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        creator = CustomUser.objects.create(username='host@example.com', in_game_name='host', full_name='Host')
+        teams = create_teams(creator, 2)
+        now = timezone.now()
+        tournament = Tournament.objects.create(title='Finals', start_time=now, end_time=now + timedelta(days=1))
+        cls.game = create_schedules(tournament, teams[0], teams[1], 1)[0]
+        cls.voter, cls.other = create_users(2, prefix='voter')
+
+    def test_each_vote_is_counted_once_across_flushes(self):
+        buffer = VoteBuffer(interval=3600)
+        self.assertTrue(buffer.add(self.game.pk, self.voter.pk, 1))
+        self.assertFalse(buffer.add(self.game.pk, self.voter.pk, 2))
+        self.assertEqual(buffer.flush(), 1)
+
+        # Once flushed, the ledger rejects the repeat; a vote another worker wrote first is dropped
+        self.assertFalse(buffer.add(self.game.pk, self.voter.pk, 2))
+        self.assertTrue(buffer.add(self.game.pk, self.other.pk, 2))
+        Vote.objects.cast(self.game.pk, self.other.pk, 2)
+        self.assertEqual(buffer.flush(), 0)
+
+        self.game.refresh_from_db()
+        self.assertEqual((self.game.vote, self.game.votes_team_1, self.game.votes_team_2), (2, 1, 1))
+
+
+# Write-behind last login
+class LastLoginBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.first, cls.second = create_users(2, prefix='regular')
+
+    def test_logins_are_coalesced_and_never_move_back(self):
+        buffer = LastLoginBuffer(interval=3600)
+        now = timezone.now()
+        buffer.add(self.first.pk, now - timedelta(minutes=5))
+        buffer.add(self.first.pk, now)
+        buffer.add(self.first.pk, now - timedelta(minutes=1))
+        buffer.add(self.second.pk, now)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(len([query for query in context.captured_queries if query['sql'].startswith('UPDATE')]), 1)
+
+        # A stale time flushed later, e.g. by another worker, leaves the newer value in place
+        buffer.add(self.first.pk, now - timedelta(hours=1))
+        buffer.flush()
+        self.assertEqual(CustomUser.objects.get(pk=self.first.pk).last_login, now)
+        self.assertEqual(CustomUser.objects.get(pk=self.second.pk).last_login, now)
+
+
+# Content-addressed uploads
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.media = media.name
+        self.creator = CustomUser.objects.create(username='designer@example.com', in_game_name='designer', full_name='Designer')
+
+    def stored_files(self):
+        return [name for _, _, names in os.walk(self.media) for name in names]
+
+    def test_identical_uploads_share_one_counted_blob(self):
+        first = Team.objects.create(creator=self.creator, name='First', logo=SimpleUploadedFile('logo.jpg', b'same image'))
+        second = Team.objects.create(creator=self.creator, name='Second', logo=SimpleUploadedFile('copy.JPG', b'same image'))
+        self.assertEqual(first.logo.name, second.logo.name)
+        self.assertEqual(len(self.stored_files()), 1)
+        self.assertEqual(Blob.objects.get(name=first.logo.name).refs, 2)
+
+        # Replacing one logo moves its reference; the last reference removes the file after commit
+        second = Team.objects.get(pk=second.pk)
+        second.logo = SimpleUploadedFile('new.jpg', b'other image')
+        second.save()
+        self.assertEqual(Blob.objects.get(name=first.logo.name).refs, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Team.objects.get(pk=first.pk).delete()
+        self.assertFalse(Blob.objects.filter(name=first.logo.name).exists())
+        self.assertEqual(self.stored_files(), [os.path.basename(second.logo.name)])
+
+    @override_settings(DERIVATIVE_WORKERS=0)
+    def test_derivatives_replace_the_original_once_rendered(self):
+        from PIL import Image
+
+        upload = io.BytesIO()
+        Image.new('RGB', (640, 480), 'red').save(upload, 'PNG')
+        self.client.force_login(self.creator)
+        with self.captureOnCommitCallbacks() as callbacks:
+            team = Team.objects.create(creator=self.creator, name='Painted', logo=SimpleUploadedFile('logo.png', upload.getvalue()))
+        row = self.client.get('/api/teams_list/').json()['results'][0]
+        self.assertTrue(row['logo_thumbnail'].endswith(team.logo.url))
+
+        for callback in callbacks:
+            callback()
+        row = self.client.get('/api/teams_list/').json()['results'][0]
+        self.assertTrue(row['logo_thumbnail'].endswith('-thumbnail.webp'))
+        self.assertTrue(row['logo_webp'].endswith('-webp.webp'))
+        with Image.open(os.path.join(self.media, 'derivatives', os.path.splitext(team.logo.name)[0] + '-thumbnail.webp')) as thumbnail:
+            self.assertEqual(thumbnail.size, (128, 96))
+
+
+class SQLiteProfileTests(TestCase):
+    def test_connections_apply_the_pragma_profile(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_atomic_takes_the_write_lock_at_begin(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'profile.sqlite3')
+        connections.settings['profile'] = {**connection.settings_dict, 'NAME': path}
+        self.addCleanup(connections.settings.pop, 'profile')
+        self.addCleanup(connections.__delitem__, 'profile')
+        self.addCleanup(connections['profile'].close)
+
+        with connections['profile'].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+        other = sqlite3.connect(path, timeout=0, isolation_level=None)
+        self.addCleanup(other.close)
+        with transaction.atomic(using='profile'):
+            # Nothing has been written yet, but a second writer is already locked out
+            with self.assertRaises(sqlite3.OperationalError):
+                other.execute('BEGIN IMMEDIATE')
+            other.execute('SELECT 1').fetchone()
+        other.execute('BEGIN IMMEDIATE')
+        other.execute('ROLLBACK')
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    # Committed data is what the harness copies to the replica; the migrations' seed rows are restored afterwards
+    serialized_rollback = True
+
+    def setUp(self):
+        clear_caches()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.replica = os.path.join(directory.name, 'replica.sqlite3')
+        connections.settings['replica'] = {**connection.settings_dict, 'NAME': self.replica}
+        self.addCleanup(connections.settings.pop, 'replica')
+        self.addCleanup(connections.__delitem__, 'replica')
+        self.addCleanup(connections['replica'].close)
+        # The sticky keys need a cache shared across workers; a file cache stands in for Redis
+        self.enterContext(override_settings(DATABASE_REPLICAS=['replica'], CACHES={
+            **settings.CACHES, 'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': os.path.join(directory.name, 'cache')},
+        }))
+
+        self.creator = CustomUser.objects.create(username='captain@example.com', in_game_name='captain', full_name='Captain')
+        self.token = Token.objects.create(user=self.creator)
+        Team.objects.create(creator=self.creator, name='Replicated')
+        self.sync_replica()
+
+    def sync_replica(self):
+        # Stands in for replication: the replica file becomes a full copy of the primary
+        connections['replica'].close()
+        connection.ensure_connection()
+        target = sqlite3.connect(self.replica)
+        try:
+            connection.connection.backup(target)
+        finally:
+            target.close()
+
+    def team_names(self, client):
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = client.get('/api/teams_list/')
+        self.assertEqual(response.status_code, 200)
+        return [team['name'] for team in response.json()['results']], len(replica_queries)
+
+    def test_safe_requests_read_from_the_replica(self):
+        Team.objects.create(creator=self.creator, name='Not replicated yet')
+        names, replica_queries = self.team_names(APIClient())
+        self.assertEqual(names, ['Replicated'])
+        self.assertGreater(replica_queries, 0)
+        # Outside a request everything stays on the primary
+        self.assertEqual(Team.objects.count(), 2)
+
+        self.sync_replica()
+        clear_caches()
+        self.assertEqual(self.team_names(APIClient())[0], ['Replicated', 'Not replicated yet'])
+
+    def test_writers_read_their_own_writes(self):
+        writer = APIClient()
+        writer.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = writer.patch(f'/api/personal_page/{self.creator.pk}/', {'in_game_name': 'skipper'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        Team.objects.create(creator=self.creator, name='Not replicated yet')
+
+        # Within the sticky window the writer reads the primary, from any address
+        names, replica_queries = self.team_names(writer)
+        self.assertEqual(names, ['Replicated', 'Not replicated yet'])
+        self.assertEqual(replica_queries, 0)
+        writer.defaults['REMOTE_ADDR'] = '10.0.0.2'
+        self.assertEqual(self.team_names(writer)[1], 0)
+
+        # Other clients still read the replica, even behind the writer's address
+        clear_caches()
+        self.assertEqual(self.team_names(APIClient(REMOTE_ADDR='10.0.0.2'))[0], ['Replicated'])
+
+    def test_clients_without_credentials_are_pinned_by_address(self):
+        response = APIClient(REMOTE_ADDR='10.0.0.4').post('/login/', {'username': 'captain@example.com', 'password': 'wrong'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.team_names(APIClient(REMOTE_ADDR='10.0.0.4'))[1], 0)
+        self.assertGreater(self.team_names(APIClient(REMOTE_ADDR='10.0.0.5'))[1], 0)
+
+    def test_logins_read_their_token_from_the_primary(self):
+        # Login issues a new token, which the replica does not have
+        self.creator.set_password('secret-pass')
+        self.creator.save()
+        self.token.delete()
+        client = APIClient()
+        buffer = LastLoginBuffer(interval=3600)
+        with mock.patch('game.views.last_login_buffer', buffer):
+            response = client.post('/login/', {'username': 'captain@example.com', 'password': 'secret-pass'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(buffer.flush(), 1)
+
+        client.credentials(HTTP_AUTHORIZATION=f"Token {response.json()['token']}")
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            self.assertEqual(client.get('/api/invitation/pending_count/').status_code, 200)
+        self.assertEqual(len(replica_queries), 0)
+
+    def test_replicas_refuse_a_per_process_cache(self):
+        with override_settings(CACHES={**settings.CACHES, 'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            with self.assertRaises(ImproperlyConfigured):
+                ReplicaRoutingMiddleware(lambda request: None)
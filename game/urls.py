@@ -1,7 +1,7 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CustomUserPersonalPageViewSet, TeamViewSet, InvitationViewSet, NotificationViewSet, TeamsListViewSet, UsersListViewSet, TournamentViewSet, TournamentRegistrationViewSet, GameScheduleViewSet
+from .views import CustomUserPersonalPageViewSet, TeamViewSet, InvitationViewSet, NotificationViewSet, TeamsListViewSet, UsersListViewSet, TournamentViewSet, TournamentRegistrationViewSet, GameScheduleViewSet, ResponseCacheStatsView, notification_stream
 
 router = DefaultRouter()
 router.register(r'personal_page', CustomUserPersonalPageViewSet)
@@ -16,5 +16,8 @@ router.register(r'game_schedule', GameScheduleViewSet, basename="game_schedule")
 
 
 urlpatterns = [
+    # Registered ahead of the router so 'stream' is not taken for a notification id
+    path('notification/stream/', notification_stream, name='notification-stream'),
+    path('cache_stats/', ResponseCacheStatsView.as_view(), name='cache-stats'),
     path('', include(router.urls)),
 ]
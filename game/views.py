@@ -1,82 +1,142 @@
-from .serializers import UserRegistrationSerializer, LoginSerializer, CustomUserSerializer, TeamSerializer, InvitationSerializer, NotificationSerializer, TeamsListSerializer, UsersListSerializer, TournamentSerializer, TournamentRegistrationSerializer, GameSerializer, GameScheduleSerializer
-from . models import CustomUser, Team, Invitation, Notification, TeamRole, Tournament, TournamentRegistration, Game, GameSchedule
+from .serializers import UserRegistrationSerializer, LoginSerializer, CustomUserSerializer, TeamSerializer, InvitationSerializer, NotificationSerializer, NotificationBroadcastSerializer, NotificationSeenSerializer, TeamsListSerializer, UsersListSerializer, TournamentSerializer, TournamentRegistrationSerializer, GameSerializer, GameScheduleSerializer, LeaderboardQuerySerializer
+from . models import CollectionVersion, CustomUser, Team, Invitation, Notification, NotificationCursor, TeamRole, Tournament, TournamentRegistration, Game, GameSchedule
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
+from .authentication import CachedTokenAuthentication, invalidate_token
 from rest_framework.authtoken.models import Token
-from django.contrib.auth import authenticate
-from django.contrib.auth.models import update_last_login
+from django.contrib.auth.hashers import make_password, check_password
+from django.contrib.auth.signals import user_login_failed
 from .permissions import PersinalPagePermission, IsTeamCreatorOrReadOnly, IsTeamCreatorOrReadOnlyForSchedule
-from django.db.models import Q, F
+from django.db.models import Q, F, Max, Prefetch
 from django.db import transaction
 from django.core.exceptions import ValidationError as DRFValidationError, PermissionDenied
-from rest_framework.exceptions import MethodNotAllowed, ValidationError
+from rest_framework.exceptions import MethodNotAllowed, ValidationError, NotFound
 from django.utils import timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from .hashing import hashing_pool, PoolSaturated
+from .buffers import last_login_buffer
+from .routers import stick
+from .caching import CachedResponseMixin, response_cache_stats
+from .events import broker, notification_event
+from . import counters
+import asyncio
+import json
+
+
+# Registration / login - async views, so PBKDF2 runs in the bounded hashing pool instead of holding a worker
+# thread. A saturated pool answers 503 with Retry-After rather than queueing behind a login surge.
+HASHING_RETRY_AFTER = 1
+
+
+# DRF 3.14 only dispatches sync handlers. This runs the same pipeline - parsers, authentication, permissions,
+# throttling, exception handling, renderers - around an async one; the sync checks run in a worker thread.
+class AsyncAPIView(APIView):
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        return self.finalize_response(request, response, *args, **kwargs)
+
+
+def _saturated():
+    return Response({'error': 'Too many sign-ins at once, try again shortly'}, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': str(HASHING_RETRY_AFTER)})
 
 
 # Registration
-class RegistrationView(APIView):
+class RegistrationView(AsyncAPIView):
     permission_classes = [AllowAny]
 
-    def post(self, request):
+    async def post(self, request):
         serializer = UserRegistrationSerializer(data=request.data)
 
-        if CustomUser.objects.filter(username=request.data["username"]).exists():
+        if await CustomUser.objects.filter(username=request.data.get('username')).aexists():
             return Response({"status": "User with this username already exists"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if serializer.is_valid():
-            user = serializer.save()
-            token, created = Token.objects.get_or_create(user=user)
-            return Response({
-                'user': serializer.data,
-                'token': token.key
-            }, status=status.HTTP_201_CREATED)
+        if not await sync_to_async(serializer.is_valid)():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            password_hash = await hashing_pool.run(make_password, serializer.validated_data['password'])
+        except PoolSaturated:
+            return _saturated()
+
+        @sync_to_async
+        def register():
+            # The user and their token are created together or not at all
+            with transaction.atomic():
+                user = serializer.save(password_hash=password_hash)
+                token = Token.objects.create(user=user)
+            return {'user': serializer.data, 'token': token.key}
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        registered = await register()
+        await stick(f"Token {registered['token']}")
+        return Response(registered, status=status.HTTP_201_CREATED)
 
 
 # Login
-class LoginAPIView(APIView):
+class LoginAPIView(AsyncAPIView):
     permission_classes = [AllowAny]
 
-    def post(self, request):
+    async def post(self, request):
         serializer = LoginSerializer(data=request.data)
-        if serializer.is_valid():
-            username = serializer.validated_data['username']
-            password = serializer.validated_data['password']
-
-            # Checks if a user with the provided username exists
-            user_exists = CustomUser.objects.filter(username=username).exists()
-            if not user_exists:
-                # If the user doesn't exist, returns error message
-                return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
-            
-            # authenticates the user
-            user = authenticate(request,  username=username, password=password)
-            if user is not None:
-                token, created = Token.objects.get_or_create(user=user)
-                update_last_login(None, user)
-                user_serializer = CustomUserSerializer(user)
-                # returns user information including token, username, in_game_name and Full_name
-                response_data = {
-                    'token': token.key,
-                    # 'username': user_serializer.data['username'],
-                    # 'in_game_name': user_serializer.data['in_game_name'],
-                    # 'full_name': user_serializer.data['full_name'], 
-                }
-                return Response(response_data)
-            else:
-                # If authentication fails but the user exists because password is incorrect
-                return Response({'error': 'Invalid password'}, status=status.HTTP_400_BAD_REQUEST)
-        else:
+        if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        username = serializer.validated_data['username']
+        password = serializer.validated_data['password']
+
+        # One lookup replaces the existence check and the lookup inside authenticate(), which is all the default
+        # ModelBackend adds; failures still send user_login_failed like authenticate() does
+        user = await CustomUser.objects.filter(username=username).afirst()
+        if user is None:
+            await user_login_failed.asend(sender=self.__class__, credentials={'username': username}, request=request._request)
+            return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        # Hashers' check_password, not the model's, so nothing is written from the pool thread. An outdated hash
+        # (older hasher or iteration count) is re-encoded there too, and saved here.
+        upgraded = []
+        try:
+            valid = await hashing_pool.run(check_password, password, user.password, lambda raw: upgraded.append(make_password(raw)))
+        except PoolSaturated:
+            return _saturated()
+        if valid and upgraded:
+            user.password = upgraded[0]
+            await user.asave(update_fields=['password'])
+        if not valid or not user.is_active:
+            await user_login_failed.asend(sender=self.__class__, credentials={'username': username}, request=request._request)
+            # The user exists, so the password is incorrect
+            return Response({'error': 'Invalid password'}, status=status.HTTP_400_BAD_REQUEST)
+
+        token, created = await Token.objects.aget_or_create(user=user)
+        # Written by the flusher in batches, so logging in never rewrites the user row
+        user.last_login = timezone.now()
+        last_login_buffer.add(user.pk, user.last_login)
+        await stick(f'Token {token.key}')
+        return Response({'token': token.key})
 
 # Logout
 class LogoutAPIView(APIView):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -86,15 +146,25 @@ class LogoutAPIView(APIView):
             return Response({'error': 'No token found for the user'}, status=status.HTTP_400_BAD_REQUEST)
 
         token.delete()
+        invalidate_token(token.key)
         return Response({'message': 'User logged out successfully'}, status=status.HTTP_200_OK)
 
 
+# Response cache hits and misses of this worker process
+class ResponseCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(dict(response_cache_stats))
+
+
 # Teams / Membership / Invitation
     # Personal page details
 class CustomUserPersonalPageViewSet(viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = CustomUserSerializer
-    authentication_classes = [TokenAuthentication]
+    ordering = 'id'
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes=[PersinalPagePermission]
 
     # Get information only owner
@@ -108,12 +178,15 @@ class CustomUserPersonalPageViewSet(viewsets.ModelViewSet):
         if 'password' in request.data:
             password = request.data['password']
             user.set_password(password)
-            user.save()
+            # request.user may be a cached copy; only the changed field is written
+            user.save(update_fields=['password'])
+            # Drops the cached copies of the user, with the old password hash, in every worker
+            invalidate_token(request.auth.key)
             return Response({'message': 'Password updated successfully'}, status=status.HTTP_200_OK)
         elif 'in_game_name' in request.data:
             in_game_name = request.data['in_game_name']
             user.in_game_name = in_game_name
-            user.save()
+            user.save(update_fields=['in_game_name'])
             return Response({'message': 'In-game name updated successfully'}, status=status.HTTP_200_OK)
         else:
             return Response({'error': 'Unsupported operation'}, status=status.HTTP_400_BAD_REQUEST)
@@ -123,6 +196,7 @@ class CustomUserPersonalPageViewSet(viewsets.ModelViewSet):
 class TeamViewSet(viewsets.ModelViewSet):
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
+    ordering = 'id'
     permission_classes = [IsAuthenticated, IsTeamCreatorOrReadOnly]
 
     def create(self, request, *args, **kwargs):
@@ -150,20 +224,27 @@ class TeamViewSet(viewsets.ModelViewSet):
 
 
     def get_queryset(self):
-        # Users can view teams they've created or are a part of
-        return Team.objects.filter(Q(creator=self.request.user) | Q(roles__member=self.request.user)).distinct()
+        # Users can view teams they've created or are a part of; the membership subquery needs no DISTINCT over a join
+        user = self.request.user
+        return Team.objects.filter(Q(creator=user) | Q(pk__in=TeamRole.objects.filter(member=user).values('team_id')))
     
 
 # Invitations
 class InvitationViewSet(viewsets.ModelViewSet):
     queryset = Invitation.objects.all()
     serializer_class = InvitationSerializer
+    ordering = '-id'
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
         return Invitation.objects.filter(Q(sender=user) | Q(receiver=user))
 
+    # Badge count of invitations waiting for the user's answer, served from the cache
+    @action(detail=False, methods=['get'])
+    def pending_count(self, request):
+        return Response({'pending': counters.pending_invitations(request.user)})
+
     def perform_create(self, serializer):
         with transaction.atomic():
             user = self.request.user
@@ -215,7 +296,6 @@ class InvitationViewSet(viewsets.ModelViewSet):
                 role, created = TeamRole.objects.get_or_create(
                     team=instance.team, member=user, defaults={'role': instance.role})
                 if created:
-                    self._update_team_status(instance.team)
                     Notification.objects.create(
                         user=instance.sender,
                         message=f"{user.get_full_name()} has accepted your invitation to join the team '{instance.team.name}' as '{instance.role}'."
@@ -226,75 +306,230 @@ class InvitationViewSet(viewsets.ModelViewSet):
                     message=f"{user.get_full_name()} has declined your invitation to join the team '{instance.team.name}' as '{instance.role}'."
                 )
 
-    def _update_team_status(self, team):
-        main_roles_count = TeamRole.objects.filter(
-            team=team,
-            role__in=[role[0] for role in TeamRole.MAIN_ROLE_CHOICES]
-        ).count()
-        if main_roles_count == len(TeamRole.MAIN_ROLE_CHOICES):
-            team.status = True
-            team.save()
 
 # Teams list
-class TeamsListViewSet(viewsets.ReadOnlyModelViewSet):
- 
+class TeamsListViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Team.objects.all()
     serializer_class = TeamsListSerializer
+    ordering = 'id'
+    version_collections = [CollectionVersion.TEAMS]
 
 
 # Users list
-class UsersListViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = CustomUser.objects.all().prefetch_related('team_roles__team')
+class UsersListViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = CustomUser.objects.prefetch_related(
+        Prefetch('team_roles', queryset=TeamRole.objects.select_related('team')))
     serializer_class = UsersListSerializer
+    ordering = 'id'
+    version_collections = [CollectionVersion.USERS]
 
 
 # Notifications
 class NotificationViewSet(viewsets.ModelViewSet):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
+    ordering = '-id'
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
         if user.is_staff:
             return Notification.objects.all()
+        # Users read their merged feed but can only change their own personal notifications
+        if self.action in ['list', 'retrieve']:
+            return Notification.objects.feed_for(user)
         return Notification.objects.filter(user=user)
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ['list', 'retrieve']:
+            context['last_seen_id'] = NotificationCursor.objects.filter(
+                user=self.request.user).values_list('last_seen_id', flat=True).first() or 0
+        return context
+
     def create(self, request, *args, **kwargs):
         user = request.user
         if not user.is_staff:
             return Response({"error": "Only admin users can send notifications."}, status=status.HTTP_403_FORBIDDEN)
-        
-        # Extract notification data from request
-        data = request.data
-
-        # Fetch all users except the admin sending the notification
-        users = CustomUser.objects.exclude(id=user.id)
-
-        notifications = []
-        for user in users:
-            # Update the 'user' field in the notification data for each user
-            data['user'] = user.id
-            serializer = self.get_serializer(data=data)
-            if serializer.is_valid():
-                serializer.save()
-                notifications.append(serializer.data)
-            else:
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(notifications, status=status.HTTP_201_CREATED)
+        serializer = NotificationBroadcastSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        # A broadcast is stored once and reaches every feed at read time
+        notification = Notification.objects.create(message=serializer.validated_data['message'])
+        return Response(NotificationSerializer(notification, context=self.get_serializer_context()).data, status=status.HTTP_201_CREATED)
 
+    # Marks the feed as seen up to the given id, or up to the newest notification
+    @action(detail=False, methods=['post'])
+    def seen(self, request):
+        serializer = NotificationSeenSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Never past the newest notification in the feed, so broadcasts sent later still arrive unseen
+        latest = Notification.objects.feed_for(request.user).aggregate(latest=Max('id'))['latest'] or 0
+        last_seen_id = min(serializer.validated_data.get('last_seen_id', latest), latest)
+
+        with transaction.atomic():
+            cursor, created = NotificationCursor.objects.get_or_create(user=request.user, defaults={'last_seen_id': last_seen_id})
+            if not created:
+                # The cursor only moves forward, even when requests arrive out of order
+                NotificationCursor.objects.filter(user=request.user, last_seen_id__lt=last_seen_id).update(
+                    last_seen_id=last_seen_id, updated_at=timezone.now())
+            read = Notification.objects.filter(user=request.user, is_read=False, id__lte=last_seen_id).update(is_read=True)
+            transaction.on_commit(lambda: counters.notifications_read(request.user.id, read))
+            transaction.on_commit(lambda: counters.notification_cursor_moved(request.user.id))
+        return Response({'last_seen_id': max(cursor.last_seen_id, last_seen_id)})
+
+    # Marks a single personal notification as read
+    @action(detail=True, methods=['post'])
+    def read(self, request, pk=None):
+        notification = self.get_object()
+        # Broadcasts have no per-user read flag; they are marked seen through the cursor
+        if notification.is_broadcast:
+            raise ValidationError("Broadcasts are marked as seen through the seen action.")
+        if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+            counters.notifications_read(notification.user_id, 1)
+        return Response({'id': notification.id, 'seen': True})
+
+    # Badge count served from the cache
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        personal = counters.unread_notifications(request.user)
+        broadcasts = counters.unread_broadcasts(request.user)
+        return Response({'unread': personal + broadcasts, 'personal': personal, 'broadcasts': broadcasts})
+
+
+
+# Notification stream - Server-Sent Events served by the ASGI app, one coroutine per connection instead of a thread
+STREAM_REPLAY_BATCH = 100
+
+
+def _format_event(event):
+    return f"id: {event['id']}\nevent: notification\ndata: {json.dumps(event)}\n\n"
+
+
+async def _stream_user(request):
+    # EventSource cannot set headers, so the token may also come in the query string
+    header = request.headers.get('Authorization', '')
+    key = header[len('Token '):] if header.startswith('Token ') else request.GET.get('token')
+    if not key:
+        return None
+    token = await Token.objects.select_related('user').filter(key=key).afirst()
+    if token is None or not token.user.is_active:
+        return None
+    return token.user
+
+
+async def _notification_events(user, last_id):
+    # Subscribe before replaying so nothing created in between is missed; ids already sent are skipped
+    subscription = broker.subscribe(user.id)
+    heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+    try:
+        yield f"retry: {heartbeat * 1000}\n\n"
+        replay = True
+        while True:
+            if replay:
+                subscription.overflowed = False
+                while True:
+                    batch = [notification async for notification in Notification.objects.feed_for(user).filter(
+                        id__gt=last_id).order_by('id')[:STREAM_REPLAY_BATCH]]
+                    for notification in batch:
+                        last_id = notification.id
+                        yield _format_event(notification_event(notification))
+                    if len(batch) < STREAM_REPLAY_BATCH:
+                        break
+                replay = False
+
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+
+            if subscription.overflowed:
+                replay = True
+            elif event['id'] > last_id:
+                last_id = event['id']
+                yield _format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def notification_stream(request):
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    user = await _stream_user(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    # Resume from the Last-Event-ID sent by reconnecting clients, or from an explicit last_id;
+    # a fresh connection only receives what is created from now on
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_id')
+    if last_id is None:
+        last_id = await Notification.objects.feed_for(user).aaggregate(latest=Max('id'))
+        last_id = last_id['latest'] or 0
+    try:
+        last_id = int(last_id)
+    except ValueError:
+        return JsonResponse({'detail': 'last_id must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = StreamingHttpResponse(_notification_events(user, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 # Tournament
-class TournamentViewSet(viewsets.ModelViewSet):
+LEADERBOARD_CACHE_TIMEOUT = 60 * 10
+
+
+class TournamentViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Tournament.objects.all()
     serializer_class = TournamentSerializer
+    ordering = '-id'
+    version_collections = [CollectionVersion.TOURNAMENTS]
+
+    # Standings are maintained when results are finalized, so reading them is one indexed query and never writes
+    @action(detail=True, methods=['get'])
+    def standings(self, request, pk=None):
+        games = Game.objects.filter(tournament_id=pk).select_related('team').order_by(*Game.STANDINGS_ORDER)
+        return Response(GameSerializer(games, many=True).data)
+
+    # Top teams by precomputed rank, plus one team's row and its neighbours. Responses are cached under the
+    # tournament's standings_version, which finalizing a result bumps, so stale entries are never read.
+    @action(detail=True, methods=['get'])
+    def leaderboard(self, request, pk=None):
+        query = LeaderboardQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        limit, team_id, window = query.validated_data['limit'], query.validated_data.get('team'), query.validated_data['window']
+
+        tournament = self.get_object()
+        key = f'leaderboard:{tournament.pk}:{tournament.standings_version}:{limit}:{team_id}:{window}'
+        data = cache.get(key)
+        if data is None:
+            games = Game.objects.filter(tournament=tournament).select_related('team')
+            data = {
+                'tournament': tournament.pk,
+                'version': tournament.standings_version,
+                'results': GameSerializer(games.order_by('rank')[:limit], many=True).data,
+                'team': None,
+                'window': [],
+            }
+            if team_id is not None:
+                rank = games.filter(team_id=team_id).values_list('rank', flat=True).first()
+                if rank is None:
+                    raise NotFound("The team is not in this tournament.")
+                around = GameSerializer(games.filter(rank__range=(rank - window, rank + window)).order_by('rank'), many=True).data
+                data['team'] = next(row for row in around if row['rank'] == rank)
+                data['window'] = around
+            cache.set(key, data, LEADERBOARD_CACHE_TIMEOUT)
+        return Response(data)
 
 
 class TournamentRegistrationViewSet(viewsets.ModelViewSet):
     queryset = TournamentRegistration.objects.all()
     serializer_class = TournamentRegistrationSerializer
+    ordering = '-id'
     permission_classes = [IsAuthenticated]
 
 
@@ -337,12 +572,16 @@ class TournamentRegistrationViewSet(viewsets.ModelViewSet):
 
 
 # Game schedule
-class GameScheduleViewSet(viewsets.ModelViewSet):
+class GameScheduleViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = GameSchedule.objects.all()
     serializer_class = GameScheduleSerializer
+    ordering = 'id'
+    version_collections = [CollectionVersion.GAME_SCHEDULE, CollectionVersion.VOTES]
 
     def get_permissions(self):
-        if self.action in ['partial_update', 'update']:
+        if self.action == 'finalize':
+            permission_classes = [IsAdminUser]
+        elif self.action in ['partial_update', 'update']:
             permission_classes = [IsAuthenticated]
         elif self.action == 'create':
             permission_classes = [IsAuthenticated,
@@ -358,7 +597,10 @@ class GameScheduleViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         updated_instance = serializer.update_vote(
             instance, serializer.validated_data)
-        return Response(GameScheduleSerializer(updated_instance).data)
+        # A buffered vote is accepted but not yet reflected in the tallies
+        buffered = settings.VOTE_WRITE_BEHIND and 'vote' in serializer.validated_data
+        return Response(GameScheduleSerializer(updated_instance).data,
+                        status=status.HTTP_202_ACCEPTED if buffered else status.HTTP_200_OK)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(
@@ -369,10 +611,19 @@ class GameScheduleViewSet(viewsets.ModelViewSet):
 
     def update(self, request, *args, **kwargs):
         return self.partial_update(request, *args, **kwargs)
+
+    # Locks in the result and counts it into the tournament standings
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        instance = self.get_object()
+        if not instance.finalize_result():
+            raise ValidationError("The result of this game has already been finalized.")
+        return Response(GameScheduleSerializer(instance).data)
     
 
 
 # Game History
 class GameViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Game.objects.all()
+    queryset = Game.objects.select_related('team')
     serializer_class = GameSerializer
+    ordering = 'id'